@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Compares enqueueing commands one call at a time with submit() and batch().
+
+A threaded SomfyRTS with a long interval is used so that only the enqueue path is measured.
+
+Run from the repository root with:  python3 -m benchmarks.bench_batch
+"""
+import time
+
+from somfyrts import SomfyRTS
+from somfyrts.serialstub import SerialStub
+
+COMMANDS = 10000
+REPEAT = 5
+
+
+def _channels(count):
+    return [(i % 5) + 1 for i in range(count)]
+
+
+def bench_per_call(count=COMMANDS):
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        start = time.perf_counter()
+        for channel in _channels(count):
+            rts.up(channel)
+        elapsed = time.perf_counter() - start
+        rts.clear_command_queue()
+    return elapsed
+
+
+def bench_submit(count=COMMANDS):
+    commands = [("U", channel) for channel in _channels(count)]
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        start = time.perf_counter()
+        rts.submit(commands)
+        elapsed = time.perf_counter() - start
+        rts.clear_command_queue()
+    return elapsed
+
+
+def bench_batch(count=COMMANDS):
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        start = time.perf_counter()
+        with rts.batch() as batch:
+            for channel in _channels(count):
+                batch.up(channel)
+        elapsed = time.perf_counter() - start
+        rts.clear_command_queue()
+    return elapsed
+
+
+def main():
+    for name, bench in (("per call", bench_per_call), ("submit", bench_submit), ("batch", bench_batch)):
+        best = min(bench() for _ in range(REPEAT))
+        print("{0:>10}: {1:8.1f} us per command".format(name, best * 1e6 / COMMANDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Compares thread count and Python heap use of per-controller threads with one SharedDispatcher.
+
+Thread stacks are not included in the heap figure; each OS thread also reserves its own stack.
+
+Run from the repository root with:  python3 -m benchmarks.bench_dispatcher
+"""
+import threading
+import time
+import tracemalloc
+
+from somfyrts import SomfyRTS
+from somfyrts.dispatcher import SharedDispatcher
+from somfyrts.serialstub import SerialStub
+
+CONTROLLER_COUNTS = (1, 10, 100)
+
+
+def measure(count, shared):
+    """Returns (threads, heap bytes, seconds to send one command per controller) for count controllers"""
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    dispatcher = SharedDispatcher() if shared else None
+    if shared:
+        controllers = [SomfyRTS(SerialStub(), interval=0, dispatcher=dispatcher) for _ in range(count)]
+    else:
+        controllers = [SomfyRTS(SerialStub(), interval=0, thread=True) for _ in range(count)]
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    threads = threading.active_count() - threads_before
+
+    start = time.perf_counter()
+    for rts in controllers:
+        rts.up(1)
+    for rts in controllers:
+        rts.flush_command_queue()
+    elapsed = time.perf_counter() - start
+
+    for rts in controllers:
+        rts.close()
+    if dispatcher is not None:
+        dispatcher.close()
+    return threads, heap, elapsed
+
+
+def main():
+    print("{0:>12} {1:>10} {2:>8} {3:>12} {4:>12}".format("controllers", "mode", "threads", "heap KiB", "send ms"))
+    for count in CONTROLLER_COUNTS:
+        for shared in (False, True):
+            threads, heap, elapsed = measure(count, shared)
+            print("{0:>12} {1:>10} {2:>8} {3:>12.1f} {4:>12.2f}".format(
+                count, "shared" if shared else "threads", threads, heap / 1024, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Measures the enqueue and dispatch hot paths of SomfyRTS and reports the results as JSON.
+
+Every measurement uses a SerialStub.  Enqueue measurements use a threaded SomfyRTS with a long interval so
+that only the first command is dispatched; dispatch measurements use interval=0.  The JSON includes the
+interpreter and platform so results from different releases and machines can be compared.
+
+Run from the repository root with:  python3 -m benchmarks.bench_hotpath [--output FILE] [--quick]
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from somfyrts import SomfyRTS
+from somfyrts.serialstub import SerialStub
+
+COMMANDS = 20000
+PRODUCERS = (1, 2, 4, 8)
+WAKEUPS = 200
+REPEAT = 3
+
+
+class TimedLock:
+    """Wraps a lock and records how long each acquisition holds it"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._acquired = 0.0
+        self.holds = []
+
+    def acquire(self, blocking=True, timeout=-1):
+        result = self._lock.acquire(blocking, timeout)
+        if result:
+            self._acquired = time.perf_counter()
+        return result
+
+    def release(self):
+        self.holds.append(time.perf_counter() - self._acquired)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def _channels(count):
+    return [(i % 5) + 1 for i in range(count)]
+
+
+def bench_enqueue(producers, count=COMMANDS):
+    """Returns commands per second queued by up() calls spread over producers threads"""
+    per_thread = count // producers
+    ready = threading.Barrier(producers + 1)
+
+    def produce(rts):
+        ready.wait()
+        for channel in _channels(per_thread):
+            rts.up(channel)
+
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        threads = [threading.Thread(target=produce, args=(rts,)) for _ in range(producers)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        rts.clear_command_queue()
+    return per_thread * producers / elapsed
+
+
+def bench_modes(count=COMMANDS):
+    """Returns microseconds per command to queue and send count commands with interval=0 without a thread, where
+    up() sends before returning, and with a thread, including the wait for it to finish"""
+    results = {}
+    for threaded in (False, True):
+        with SomfyRTS(SerialStub(), interval=0, thread=threaded) as rts:
+            start = time.perf_counter()
+            for channel in _channels(count):
+                rts.up(channel)
+            rts.flush_command_queue()
+            elapsed = time.perf_counter() - start
+        results["threaded" if threaded else "unthreaded"] = elapsed * 1e6 / count
+    return results
+
+
+def bench_dispatch(count=COMMANDS):
+    """Returns microseconds per command spent dispatching, the unthreaded send time less the enqueue time"""
+    commands = [("U", channel) for channel in _channels(count)]
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        start = time.perf_counter()
+        rts.submit(commands)
+        enqueue = time.perf_counter() - start
+        rts.clear_command_queue()
+    with SomfyRTS(SerialStub(), interval=0) as rts:
+        start = time.perf_counter()
+        rts.submit(commands)
+        total = time.perf_counter() - start
+    return (total - enqueue) * 1e6 / count
+
+
+def bench_lock_hold(producers=4, count=COMMANDS):
+    """Returns statistics in microseconds of the time the queue lock is held while producers threads queue
+    count commands for a threaded SomfyRTS that dispatches them with interval=0"""
+    per_thread = count // producers
+    with SomfyRTS(SerialStub(), interval=0, thread=True) as rts:
+        rts.flush_command_queue()
+        lock = rts._lock = TimedLock(rts._lock)
+        threads = [threading.Thread(target=lambda: [rts.up(channel) for channel in _channels(per_thread)])
+                   for _ in range(producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rts.flush_command_queue()
+        holds = sorted(lock.holds)
+    return {
+        "acquisitions": len(holds),
+        "mean_us": statistics.mean(holds) * 1e6,
+        "p99_us": holds[int(len(holds) * 0.99)] * 1e6,
+        "max_us": holds[-1] * 1e6,
+    }
+
+
+def bench_flush_wakeup(count=WAKEUPS):
+    """Returns statistics in microseconds of the time from a command's write completing to the return of
+    flush_command_queue() in the thread waiting for it"""
+    latencies = []
+    with SomfyRTS(SerialStub(), interval=0, thread=True) as rts:
+        for _ in range(count):
+            future, = rts.up(1)
+            rts.flush_command_queue()
+            latencies.append(time.monotonic() - future.result())
+    latencies.sort()
+    return {
+        "median_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "max_us": latencies[-1] * 1e6,
+    }
+
+
+def bench_memory(count=COMMANDS):
+    """Returns Python heap bytes per queued command, including its future"""
+    with SomfyRTS(SerialStub(), interval=3600, thread=True) as rts:
+        rts.up(1)
+        rts.flush_command_queue(timeout=0.1)
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for channel in _channels(count):
+            rts.up(channel)
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rts.clear_command_queue()
+    return (after - before) / count
+
+
+def run(count=COMMANDS, repeat=REPEAT):
+    """Runs every benchmark and returns the results as a dict.  Timings are the best of repeat runs."""
+    modes = [bench_modes(count) for _ in range(repeat)]
+    return {
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commands": count,
+        "enqueue_per_second": {str(producers): max(bench_enqueue(producers, count) for _ in range(repeat))
+                               for producers in PRODUCERS},
+        "dispatch_us_per_command": min(bench_dispatch(count) for _ in range(repeat)),
+        "send_us_per_command": {mode: min(result[mode] for result in modes) for mode in modes[0]},
+        "lock_hold": bench_lock_hold(count=count),
+        "flush_wakeup": bench_flush_wakeup(),
+        "bytes_per_queued_command": bench_memory(count),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure the SomfyRTS enqueue and dispatch hot paths")
+    parser.add_argument('--output', type=str, metavar="FILE", help="write the JSON to FILE instead of stdout")
+    parser.add_argument('--quick', action='store_true', help="run fewer commands once, for a smoke test")
+    args = parser.parse_args()
+    results = run(2000, 1) if args.quick else run()
+    text = json.dumps(results, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Measures enqueue and dispatch cost of the command queue at increasing queue depths.
+
+Run from the repository root with:  python3 -m benchmarks.bench_queue
+"""
+import time
+
+from somfyrts.commandqueue import CommandQueue, QueuedCommand
+
+DEPTHS = (10, 100, 1000, 10000, 100000, 1000000)
+OPERATIONS = 10000
+
+
+def _fill(queue, depth):
+    entry = QueuedCommand(1, 'U', b'U1\r')
+    for _ in range(depth):
+        queue.put(entry)
+
+
+def bench_command_queue(depth, operations=OPERATIONS):
+    """Returns (enqueue, dispatch) nanoseconds per operation with depth commands already queued"""
+    queue = CommandQueue()
+    _fill(queue, depth)
+    entry = QueuedCommand(2, 'D', b'D2\r')
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.put(entry)
+    enqueue = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.get()
+    dispatch = time.perf_counter() - start
+    return enqueue * 1e9 / operations, dispatch * 1e9 / operations
+
+
+def bench_list(depth, operations=OPERATIONS):
+    """Same measurement using the plain list and pop(0) that CommandQueue replaced"""
+    queue = ['U1\r'] * depth
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.append('D2\r')
+    enqueue = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(operations):
+        queue.pop(0)
+    dispatch = time.perf_counter() - start
+    return enqueue * 1e9 / operations, dispatch * 1e9 / operations
+
+
+def main():
+    print("{0:>10} {1:>14} {2:>14} {3:>14} {4:>14}".format(
+        "depth", "queue put ns", "queue get ns", "list put ns", "list pop ns"))
+    for depth in DEPTHS:
+        put_ns, get_ns = bench_command_queue(depth)
+        list_put_ns, list_pop_ns = bench_list(depth)
+        print("{0:>10} {1:>14.1f} {2:>14.1f} {3:>14.1f} {4:>14.1f}".format(
+            depth, put_ns, get_ns, list_put_ns, list_pop_ns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Measures the cold start time of python3 -m somfyrts TEST -up 1.
+
+Each run is a fresh interpreter.  The median wall time is reported next to that of a bare interpreter, followed
+by the slowest imports reported by python3 -X importtime.  With --budget the exit status is 1 if the time the
+command line adds to interpreter startup exceeds the budget, so the check can run in CI.
+
+Run from the repository root with:  python3 -m benchmarks.bench_startup [--budget MS]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMAND = ["-m", "somfyrts", "TEST", "-up", "1", "-interval", "0"]
+BASELINE = ["-c", "pass"]
+REPEAT = 21
+TOP = 12
+
+
+def _run(args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace"))
+    return elapsed, result.stderr
+
+
+def bench_wall(args, repeat=REPEAT):
+    """Returns the median wall time in seconds of running the interpreter with args"""
+    _run(args)      # warm the file system cache and write any .pyc files
+    return statistics.median(_run(args)[0] for _ in range(repeat))
+
+
+def slowest_imports(args, top=TOP):
+    """Returns (cumulative us, module) for the slowest top level imports reported by -X importtime"""
+    _, stderr = _run(["-X", "importtime"] + args)
+    imports = []
+    for line in stderr.decode().splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("   "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure cold start time of the somfyrts command line")
+    parser.add_argument('--budget', type=float, metavar="MS",
+                        help="fail if the command line adds more than MS milliseconds to interpreter startup")
+    args = parser.parse_args()
+
+    baseline = bench_wall(BASELINE)
+    command = bench_wall(COMMAND)
+    print("{0:>24}: {1:7.1f} ms".format("python3 -c pass", baseline * 1e3))
+    print("{0:>24}: {1:7.1f} ms".format("somfyrts TEST -up 1", command * 1e3))
+    print("{0:>24}: {1:7.1f} ms".format("added", (command - baseline) * 1e3))
+    print()
+    print("slowest top level imports (cumulative):")
+    for cumulative, name in slowest_imports(COMMAND):
+        print("{0:>24}: {1:7.1f} ms".format(name, cumulative / 1e3))
+
+    if args.budget is not None and (command - baseline) * 1e3 > args.budget:
+        print("over budget of {0} ms".format(args.budget))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Load generator that replays a mix of up(), down(), stop(), and clear_command_queue() calls from many threads
+against one threaded SomfyRTS on a SerialStub, the way UI, schedule, and sensor threads share a controller.
+
+Reports percentiles of the time each call takes to queue its command (enqueue latency) and of the time from
+queueing to the completed write (command-to-wire latency), contention on the queue lock, and an accounting
+check: every call must report its command queued, every queued command must end exactly once (written,
+superseded, or cleared), and the port must receive exactly the commands reported written.  Any lost or
+duplicated command makes the exit status 1.
+
+Run from the repository root with:  python3 -m benchmarks.loadgen [-threads N] [-mix up=45,down=45,stop=9,clear=1]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from somfyrts import SomfyRTS
+from somfyrts.serialstub import SerialStub
+from somfyrts.tracing import ENQUEUED, WRITTEN, FINAL_EVENTS
+
+OPERATIONS = ("up", "down", "stop", "clear")
+PERCENTILES = (("p50", 0.50), ("p99", 0.99), ("p999", 0.999))
+
+
+class ContentionLock:
+    """Wraps a lock and counts the acquisitions that had to wait for another thread, and for how long"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        # The counters are only updated with the lock held.
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_time += time.perf_counter() - start
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class EventLog:
+    """Listener that keeps every lifecycle event by command"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = {}        # future of a queued command -> [(event, clock time), ...]
+
+    def __call__(self, event, entry, now):
+        with self._lock:
+            self.events.setdefault(entry.future, []).append((event, now))
+
+
+def parse_mix(text):
+    """Returns a dict of operation -> weight from text like 'up=45,down=45,stop=9,clear=1'"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError("unknown operation '{0}' in mix, expected one of {1}".format(name, ", ".join(OPERATIONS)))
+        mix[name] = float(weight) if weight else 1.0
+    if sum(mix.values()) <= 0:
+        raise ValueError("mix '{0}' has no positive weights".format(text))
+    return mix
+
+
+def percentiles(values):
+    """Returns a dict of the PERCENTILES of values, in microseconds"""
+    values = sorted(values)
+    if not values:
+        return {name: None for name, _ in PERCENTILES}
+    return {name: values[min(len(values) - 1, int(len(values) * fraction))] * 1e6 for name, fraction in PERCENTILES}
+
+
+def run(threads=8, calls=2000, mix="up=45,down=45,stop=9,clear=1", channels=5, interval=0.0, write_delay=0.0,
+        coalesce=False, seed=0):
+    """Runs the load and returns the results as a dict.
+
+    Keyword arguments:
+    threads -- number of producer threads
+    calls -- number of calls made by each thread
+    mix -- relative weight of each operation, see parse_mix()
+    channels -- commands go to channels chosen at random from 1 to channels
+    interval -- interval passed to SomfyRTS
+    write_delay -- seconds each write to the SerialStub takes
+    coalesce -- coalesce passed to SomfyRTS
+    seed -- seed of the random choices, thread n uses seed + n"""
+    weights = parse_mix(mix)
+    names = list(weights)
+    log = EventLog()
+    port = SerialStub(write_delay)
+    enqueue_latency = [[] for _ in range(threads)]
+    clears = [0] * threads
+    errors = []
+    ready = threading.Barrier(threads + 1)
+
+    def produce(index, rts):
+        try:
+            _produce(index, rts)
+        except Exception as e:
+            errors.append(e)
+            raise
+
+    def _produce(index, rts):
+        choices = random.Random(seed + index)
+        operations = choices.choices(names, [weights[name] for name in names], k=calls)
+        targets = [choices.randint(1, channels) for _ in range(calls)]
+        latency = enqueue_latency[index]
+        ready.wait()
+        for operation, channel in zip(operations, targets):
+            if operation == "clear":
+                rts.clear_command_queue()
+                clears[index] += 1
+            else:
+                method = getattr(rts, operation)
+                start = time.perf_counter()
+                method(channel)
+                latency.append(time.perf_counter() - start)
+
+    with SomfyRTS(port, interval=interval, thread=True, coalesce=coalesce) as rts:
+        if not 1 <= channels <= rts._codec.channel_count:
+            raise ValueError("channels must be 1 through {0}".format(rts._codec.channel_count))
+        lock = rts._lock = ContentionLock(rts._lock)
+        rts.add_listener(log)
+        producers = [threading.Thread(target=produce, args=(index, rts)) for index in range(threads)]
+        for producer in producers:
+            producer.start()
+        ready.wait()
+        start = time.perf_counter()
+        for producer in producers:
+            producer.join()
+        rts.flush_command_queue()
+        elapsed = time.perf_counter() - start
+        rts.remove_listener(log)
+    if errors:
+        raise errors[0]
+
+    finals = {event: 0 for event in FINAL_EVENTS}
+    wire_latency = []
+    # Every call traces ENQUEUED for a future of its own, coalesced or not, so a call missing from the log was
+    # never reported at all.
+    calls_made = sum(len(latency) for latency in enqueue_latency)
+    lost = max(0, calls_made - len(log.events))
+    duplicated = 0
+    for future, events in log.events.items():
+        ends = [(event, now) for event, now in events if event in FINAL_EVENTS]
+        if not ends:
+            lost += 1
+            continue
+        if len(ends) > 1:
+            duplicated += len(ends) - 1
+        event, now = ends[0]
+        finals[event] += 1
+        if event == WRITTEN:
+            wire_latency.append(now - events[0][1] if events[0][0] == ENQUEUED else float("nan"))
+    # Writes that reached the port without being reported, or reported writes that never reached it.
+    unreported = len(port.output) - finals[WRITTEN]
+    if unreported > 0:
+        duplicated += unreported
+    else:
+        lost -= unreported
+    return {
+        "threads": threads,
+        "mix": weights,
+        "interval": interval,
+        "coalesce": coalesce,
+        "seconds": elapsed,
+        "commands_queued": len(log.events),
+        "calls": calls_made,
+        "clears": sum(clears),
+        "final_events": finals,
+        "frames_written": len(port.output),
+        "lost": lost,
+        "duplicated": duplicated,
+        "enqueue_latency_us": percentiles([value for latency in enqueue_latency for value in latency]),
+        "wire_latency_us": percentiles(wire_latency),
+        "lock": {
+            "acquisitions": lock.acquisitions,
+            "contended": lock.contended,
+            "contended_fraction": lock.contended / lock.acquisitions if lock.acquisitions else 0.0,
+            "wait_seconds": lock.wait_time,
+        },
+    }
+
+
+def _format(results):
+    lines = ["{0} threads, {1} calls ({2} clears) in {3:.3f} seconds, {4} frames written".format(
+        results["threads"], results["calls"] + results["clears"], results["clears"], results["seconds"],
+        results["frames_written"])]
+    lines.append("{0:<24} {1:>12} {2:>12} {3:>12}".format("latency (us)", "p50", "p99", "p999"))
+    for name in ("enqueue_latency_us", "wire_latency_us"):
+        values = results[name]
+        lines.append("{0:<24} {1:>12.1f} {2:>12.1f} {3:>12.1f}".format(
+            name[:-3], *(float("nan") if values[key] is None else values[key] for key, _ in PERCENTILES)))
+    lock = results["lock"]
+    lines.append("lock: {0} acquisitions, {1} contended ({2:.1%}), {3:.6f} seconds waiting".format(
+        lock["acquisitions"], lock["contended"], lock["contended_fraction"], lock["wait_seconds"]))
+    lines.append("commands: " + ", ".join("{0} {1}".format(count, event)
+                                          for event, count in results["final_events"].items()))
+    lines.append("lost: {0}, duplicated: {1}".format(results["lost"], results["duplicated"]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay a multi-threaded command mix against a SerialStub")
+    parser.add_argument('-threads', type=int, default=8, help="number of producer threads")
+    parser.add_argument('-calls', type=int, default=2000, help="calls made by each thread")
+    parser.add_argument('-mix', type=str, default="up=45,down=45,stop=9,clear=1",
+                        help="relative weights of up, down, stop, and clear calls")
+    parser.add_argument('-channels', type=int, default=5, help="highest channel number used")
+    parser.add_argument('-interval', type=float, default=0.0, help="seconds between commands")
+    parser.add_argument('-write_delay', type=float, default=0.0, help="seconds each write takes")
+    parser.add_argument('-coalesce', action='store_true', help="coalesce queued commands per channel")
+    parser.add_argument('-seed', type=int, default=0, help="seed for the random mix")
+    parser.add_argument('-json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    try:
+        results = run(args.threads, args.calls, args.mix, args.channels, args.interval, args.write_delay,
+                      args.coalesce, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print(_format(results))
+    sys.exit(1 if results["lost"] or results["duplicated"] else 0)
+
+
+if __name__ == "__main__":
+    main()
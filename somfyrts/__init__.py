@@ -9,41 +9,350 @@
 """\
 Send motor control commands for Somfy RTS devices through Somfy Universal RTS controller
 """
-import datetime
 import threading
-from serial import Serial
+
+from somfyrts.clock import MonotonicClock
+from somfyrts.codec import CommandCodec, get_codec, register_codec
+from somfyrts.commandqueue import CommandFuture, CommandQueue, CommandQueueFull, QueuedCommand, \
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITIES
+from somfyrts.events import ENQUEUED, SUPERSEDED, DISPATCHED, WRITTEN, FAILED, CLEARED, CANCELLED, CLOSED
+from somfyrts.pacing import Pacer, RFDomain, get_rf_domain
 
 import logging
 logger = logging.getLogger(__name__)
 
+# The journal, metrics, recorder, and acknowledgement modules are imported by SomfyRTS.__init__() only when their
+# option is used, keeping them out of the start up time of the command line.
+
+
+def __getattr__(name):
+    # NotAcknowledged is part of the package interface but lives with the optional acknowledgement code.
+    if name == "NotAcknowledged":
+        from somfyrts.responses import NotAcknowledged
+        return NotAcknowledged
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+# Priority used for each command when up(), down(), or stop() is called without an explicit priority.  Stop
+# commands jump ahead of any queued up and down traffic.
+DEFAULT_PRIORITIES = {'U': PRIORITY_NORMAL, 'D': PRIORITY_NORMAL, 'S': PRIORITY_HIGH}
+
+
+class SomfyRTSBase:
+    """Command validation, encoding, queueing, and pacing shared by SomfyRTS and AsyncSomfyRTS.
+
+    Subclasses decide how the queue is protected and when it is processed."""
+
+    def __init__(self, port, interval, version, queue_capacity, coalesce, clock, rf_domain=None):
+        self._codec = get_codec(version)
+        self._clock = clock
+        if rf_domain is None:
+            self._pacer = Pacer(interval)
+        elif isinstance(rf_domain, str):
+            self._pacer = get_rf_domain(rf_domain, interval)
+        else:
+            self._pacer = rf_domain
+        if isinstance(port, str):
+            from serial import Serial     # imported here so that pyserial is only loaded to open a real port
+            port = Serial(port)
+        self._ser = port
+        self._command_queue = CommandQueue(queue_capacity, coalesce)
+        self._acks = None       # AckTracker when responses are read
+        self._metrics = None    # Metrics when commands are measured
+        self._recorder = None   # FlightRecorder of the last commands sent
+        self._listeners = None  # tuple of lifecycle listeners, None when there are none
+
+    @property
+    def channel_count(self):
+        """Number of channels supported by the controller.  Channels are numbered from 1."""
+        return self._codec.channel_count
+
+    @property
+    def commands_replaced(self):
+        """Number of pending commands superseded by a newer command for the same channel (coalesce mode)"""
+        return self._command_queue.replaced
+
+    @property
+    def commands_dropped(self):
+        """Number of commands discarded because the same command was already pending (coalesce mode)"""
+        return self._command_queue.dropped
+
+    def submit(self, commands):
+        """Queues many commands at once.  Every command is validated and encoded before any is queued, then all
+        of them are added under a single lock acquisition with a single wakeup of the dispatcher.
+
+        Returns the same kind of result as up(), down(), and stop() for all of the commands, in order.
+
+        Keyword arguments:
+        commands -- iterable of (command, channels) or (command, channels, priority) tuples where command is
+                    'U', 'D', or 'S' and channels is None, an integer, or a collection of integers"""
+        entries = []
+        for item in commands:
+            entries.extend(self._make_entries(*item))
+        return self._publish(entries)
+
+    def add_listener(self, listener):
+        """Adds a function called as listener(event, entry, now) at each step in the life of every command
+        queued from now on.  event is one of the names in somfyrts.events, entry is the QueuedCommand, and now
+        is the clock time.  Listeners run on the thread where the event happens, some while the queue is
+        locked, so they must be quick, must not keep entry, and must not call into this object.  Without
+        listeners each hook costs a single test."""
+        self._listeners = (self._listeners or ()) + (listener,)
+        self._command_queue.on_superseded = self._superseded
+
+    def remove_listener(self, listener):
+        """Removes a listener added with add_listener()"""
+        listeners = tuple(added for added in self._listeners or () if added is not listener)
+        self._listeners = listeners or None
+        if not listeners:
+            self._command_queue.on_superseded = None
+
+    def batch(self):
+        """Returns a CommandBatch context manager.  Commands sent through the batch are queued together by
+        submit() when the with block exits without an exception."""
+        return CommandBatch(self)
+
+    def _do_command(self, command, channels, priority):
+        return self._publish(self._make_entries(command, channels, priority))
+
+    # channels can be None (returns an empty list), an integer, or a collection of integers
+    def _make_entries(self, command, channels, priority=None):
+        if channels is None:
+            return []
+        if priority is None:
+            priority = DEFAULT_PRIORITIES.get(command, PRIORITY_NORMAL)
+        if isinstance(channels, int):
+            channels = (channels,)
+        return [self._make_entry(command, c, priority) for c in channels]
+
+    def _make_entry(self, command, channel, priority):
+        assert self._codec.is_valid(command, channel)
+        assert priority in PRIORITIES
+        return QueuedCommand(channel, command, self._codec.encode(command, channel), priority, CommandFuture())
+
+    # Called with the queue protected.  Returns (entry, 0.0) if entry should be written now, (None, delay) if
+    # the next command must wait delay seconds, or (None, None) if there is nothing left to send.  Commands
+    # whose futures were cancelled while queued are discarded without using a slot.
+    def _next_command(self, now):
+        while True:
+            entry = self._command_queue.peek()
+            if entry is None:
+                return None, None
+            if entry.future is not None and entry.future.cancelled():
+                self._command_queue.get()
+                if self._metrics is not None:
+                    self._metrics.cancelled += 1
+                if self._listeners is not None:
+                    self._trace(CANCELLED, entry, now)
+                continue
+            delay = self._pacer.reserve(now)
+            if delay > 0.0:
+                return None, delay
+            self._command_queue.get()
+            # A future cancelled since the check above wastes the reserved slot, which is harmless.
+            if entry.future is None or entry.future.set_running_or_notify_cancel():
+                if self._listeners is not None:
+                    self._trace(DISPATCHED, entry, now)
+                return entry, 0.0
+            if self._listeners is not None:
+                self._trace(CANCELLED, entry, now)
+
+    # Writes the command to the serial port and records the time the write completed.  If the write fails the
+    # command's future fails with the same exception, which is then raised.
+    def _send(self, entry):
+        logger.info("sending command: %s", entry.data)
+        timed = self._acks is not None or self._metrics is not None or self._recorder is not None
+        start = self._clock.now() if timed else None
+        if self._acks is not None:
+            self._acks.sent(entry, start)
+        try:
+            self._ser.write(entry.data)
+        except Exception as e:
+            if self._recorder is not None:
+                logger.error("write of %s failed.  Last commands sent:\n%s", entry.data, self._recorder.format())
+            if self._listeners is not None:
+                self._trace(FAILED, entry, self._clock.now())
+            if entry.future is not None:
+                entry.future.set_exception(e)
+            raise
+        now = self._clock.now()
+        self._pacer.sent(now)
+        if self._metrics is not None:
+            self._metrics.written(entry, start, now)
+        if self._recorder is not None:
+            wait = start - entry.queued if entry.queued is not None else float("nan")
+            self._recorder.record(now, entry.channel, entry.command, wait)
+        if self._listeners is not None:
+            self._trace(WRITTEN, entry, now)
+        if entry.future is not None:
+            entry.future.set_result(now)
+
+    # A failing listener is logged and otherwise ignored.  Some events are traced with the queue locked or between
+    # taking a command and writing it, where an exception would leave the lock held or the command unfinished.
+    def _trace(self, event, entry, now):
+        for listener in self._listeners or ():
+            try:
+                listener(event, entry, now)
+            except Exception:
+                logger.exception("listener %r failed on %s event", listener, event)
+
+    # Called by the queue, which is protected, just before a coalesced command replaces entry.
+    def _superseded(self, entry):
+        self._trace(SUPERSEDED, entry, self._clock.now())
+
+    # Called with the queue protected.  Queues entries like put_many(), telling any listeners about each command
+    # before a later command in the same batch can supersede it.  A duplicate of a pending command is merged into
+    # it, which ends the duplicate's life as soon as it starts.  Returns the entries now holding the commands and
+    # the future of each command.  The futures are read as each command is queued because a later command in the
+    # batch may replace the future of the entry holding an earlier one.
+    def _put(self, entries):
+        self._command_queue.check_capacity(len(entries))
+        traced = self._listeners is not None
+        now = self._clock.now() if traced else None
+        queued = []
+        futures = []
+        for entry in entries:
+            if traced:
+                self._trace(ENQUEUED, entry, now)
+            pending = self._command_queue.put(entry)
+            if traced and pending.future is not entry.future:
+                self._trace(SUPERSEDED, entry, now)
+            queued.append(pending)
+            futures.append(pending.future)
+        return queued, futures
+
+    # Called with the queue protected just before it is cleared.
+    def _trace_discarded(self, event):
+        now = self._clock.now()
+        for entry in self._command_queue:
+            self._trace(event, entry, now)
+
 
-class SomfyRTS:
+class CommandBatch:
+    """Collects commands and queues them together when the with block exits.  Created by batch().
+
+    After the with block the futures attribute holds the result of submit() for the collected commands."""
+
+    def __init__(self, rts):
+        self._rts = rts
+        self._entries = []
+        self.futures = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.futures = self._rts._publish(self._entries)
+        self._entries = []
+
+    def up(self, channels, priority=None):
+        """Adds an up command for one or more channels to the batch"""
+        self._entries.extend(self._rts._make_entries("U", channels, priority))
+
+    def down(self, channels, priority=None):
+        """Adds a down command for one or more channels to the batch"""
+        self._entries.extend(self._rts._make_entries("D", channels, priority))
+
+    def stop(self, channels, priority=None):
+        """Adds a stop command for one or more channels to the batch"""
+        self._entries.extend(self._rts._make_entries("S", channels, priority))
+
+
+class SomfyRTS(SomfyRTSBase):
     """Sends commands via RS232 serial interface to a Somfy Universal RTS Interface device"""
 
-    def __init__(self, port, interval=1.5, version=1, thread=False):
+    def __init__(self, port, interval=1.5, version=1, thread=False, queue_capacity=None, coalesce=False,
+                 clock=None, dispatcher=None, rf_domain=None, acks=False, journal=None, metrics=False,
+                 recorder=None):
         """Opens the specified port and initializes the RTS interface object.
 
         Keyword arguments:
         port -- either a url for serial port to open or an open serial port instance
-        version -- either 1 or 2 depending on model of Universal RTS Interface
-        thread -- if True then up(), down(), and stop() return immediately and will be processed asynchronously"""
-
-        self._last_command_time = datetime.datetime.min
-        self._interval_timedelta = datetime.timedelta(seconds=interval)
-        self._version = version
+        version -- either 1 or 2 depending on model of Universal RTS Interface, or a version added with
+                   register_codec()
+        thread -- if True then up(), down(), and stop() return immediately and will be processed asynchronously
+        queue_capacity -- maximum number of pending commands (None for no limit).  Adding a command to a full
+                          queue raises CommandQueueFull
+        coalesce -- if True a new command for a channel replaces that channel's pending command rather than
+                    being queued behind it
+        clock -- object providing now(), wait(event, timeout), and attach(thread) used to pace commands.
+                 Defaults to MonotonicClock.  Use a VirtualClock for tests and simulations
+        dispatcher -- a SharedDispatcher whose thread processes this object's commands.  Like thread=True,
+                      up(), down(), and stop() return immediately, but no thread is created.  Defaults the clock
+                      to the dispatcher's clock
+        rf_domain -- an RFDomain, or the name of one, shared with other controllers in the same radio
+                     environment.  The interval is then kept between commands from all of them.  A new domain
+                     created by name uses this object's interval
+        acks -- if True a thread reads the controller's responses and matches them to the commands sent.  See
+                acknowledgement().  The port must support read(), in_waiting, and cancel_read()
+        journal -- path of a CommandJournal, or a CommandJournal, that keeps queued commands on disk.  Commands
+                   left in the journal by an earlier process that died are queued again here.  With
+                   thread=False and no dispatcher they are sent before the constructor returns.  Commands
+                   discarded by close() are retired from the journal like those cleared by
+                   clear_command_queue(), so a deliberate shutdown is not replayed later.  close() closes the
+                   journal
+        metrics -- if True counters and histograms describing the queue and dispatch are kept in the metrics
+                   attribute.  See somfyrts.metrics
+        recorder -- number of commands, or a FlightRecorder, to keep the timing of the last commands sent in
+                    the recorder attribute.  The record is logged if a write fails"""
 
-        self._ser = Serial(port) if isinstance(port, str) else port
+        assert dispatcher is None or not thread
+        if clock is None:
+            clock = MonotonicClock() if dispatcher is None else dispatcher.clock
+        assert dispatcher is None or clock is dispatcher.clock
+        super().__init__(port, interval, version, queue_capacity, coalesce, clock, rf_domain)
 
         self._lock = threading.Lock()
-        self._command_queue = []
+        self._dispatch_lock = threading.Lock()
         self._check_queue = threading.Event()
         self._closed = threading.Event()
         self._queue_is_empty = threading.Event()
         self._queue_is_empty.set()
         self._thread = None
+        self._reader = None
+        self._dispatcher = dispatcher
+        # Everything that can fail is built before the threads start, so a failed constructor leaves no thread
+        # behind to keep the interpreter from exiting.
+        if metrics:
+            from somfyrts.metrics import Metrics
+            self._metrics = Metrics(self._command_queue)
+        if isinstance(recorder, int):
+            from somfyrts.recorder import FlightRecorder
+            recorder = FlightRecorder(recorder)
+        self._recorder = recorder
+        if acks:
+            from somfyrts.responses import AckTracker
+            self._acks = AckTracker()
+        if isinstance(journal, str):
+            from somfyrts.journal import CommandJournal
+            journal = CommandJournal(journal)
+        self._journal = journal
+
         if thread:
             self._thread = threading.Thread(target=lambda: self._thread_process_queue())
             self._thread.start()
+            self._clock.attach(self._thread)
+        if acks:
+            self._reader = threading.Thread(target=lambda: self._thread_read_responses(), name="SomfyRTS reader")
+            self._reader.daemon = True
+            self._reader.start()
+        if self._journal is not None:
+            try:
+                self._journal.replay(self.submit)
+            except:
+                self.close()
+                raise
+
+    @property
+    def metrics(self):
+        """The Metrics of an object created with metrics=True, otherwise None"""
+        return self._metrics
+
+    @property
+    def recorder(self):
+        """The FlightRecorder of an object created with recorder=, otherwise None"""
+        return self._recorder
 
     def __enter__(self):
         """Performs no function.  Returns original SomfyRTS object (self)."""
@@ -53,96 +362,158 @@ class SomfyRTS:
         """Closes the serial port and terminates the background thread if there is one."""
         self.close()
 
+    # Reader thread.  Runs until close() cancels the pending read.
+    def _thread_read_responses(self):
+        from somfyrts.responses import ResponseParser
+        parser = ResponseParser(self._codec)
+        while not self._closed.isSet():
+            try:
+                data = self._ser.read(self._ser.in_waiting or 1)
+            except Exception:
+                if not self._closed.isSet():
+                    logger.exception("error reading responses")
+                return
+            if data:
+                now = self._clock.now()
+                for command, channel in parser.feed(data):
+                    self._acks.received(command, channel, now)
+
     def _thread_process_queue(self):
-        while self._process_command_queue():
-            self._check_queue.wait()
+        while True:
+            try:
+                if not self._process_command_queue():
+                    return
+            except Exception:
+                # The future of the command that failed holds the error.  Carry on with the rest of the queue.
+                logger.exception("error while sending commands")
+                continue
+            self._clock.wait(self._check_queue)
 
     # Returns True if all commands have been processed.  Returns False if the the self_.closed event has been set
     # indicating that the thread should exit.
+    #
+    # Only one thread processes the queue at a time (_dispatch_lock).  _lock only guards the queue itself and is
+    # released while sleeping and while writing so that a slow serial port never blocks producers.
     def _process_command_queue(self):
-        self._lock.acquire()
-        while (not self._closed.isSet()) and (len(self._command_queue) > 0):
-            # now we do one of two things:  sleep or process the command.  If we sleep then we want to check
-            # the status of the queue again because it could have changed through close() or clear_command_queue()
-            time_since_last_cmd = (datetime.datetime.now() - self._last_command_time)
-            sleep_time = (self._interval_timedelta - time_since_last_cmd).total_seconds()
-            if sleep_time > 0.0:
-                logger.info("sleeping {0} seconds between commands".format(sleep_time))
-                self._lock.release()
-                self._closed.wait(timeout=sleep_time)
-                self._lock.acquire()
-            else:
-                cmd = self._command_queue.pop(0)
-                logger.info("sending command: {0}".format(cmd))
-                self._ser.write(bytes(cmd, "utf-8"))
-                self._last_command_time = datetime.datetime.now()
-        self._queue_is_empty.set()
-        self._check_queue.clear()
-        keep_running = not self._closed.isSet()
-        self._lock.release()
-        return keep_running
-
-    # channels can be None (function does nothing), an integer, or a collection of integers
-    def _do_command(self, command, channels):
-        if channels is not None:
-            if isinstance(channels, int):
-                self._do_single_command(command, channels)
-            else:
-                for c in channels:
-                    self._do_single_command(command, c)
-
-    def _do_single_command(self, command, channel):
-        assert channel >= 1
-        assert (self._version == 1 and channel <= 5) or (self._version == 2 and channel <= 16)
-        assert command in ('U', 'D', 'S')
-        assert not self._closed.isSet()
+        with self._dispatch_lock:
+            sleep_time = self._dispatch_ready()
+            while sleep_time is not None:
+                # If we sleep then we want to check the status of the queue again because it could have changed
+                # through close() or clear_command_queue()
+                logger.info("sleeping %s seconds between commands", sleep_time)
+                self._clock.wait(self._closed, sleep_time)
+                sleep_time = self._dispatch_ready()
+        return not self._closed.isSet()
 
-        # TODO:  The documentation for version II controller does not show a terminating \r for commands.  Because
-        # TODO:  the author does not have a version II controller, he is unable to verify if this is correct.
-        # TODO:  If a future user finds the answer, please either correct this code by adding a trailing \r and
-        # TODO:  correcting test_version_2() or if a trailing \r is not required, please remove these comments.
-        cmd = "{0}{1}\r" if self._version == 1 else "01{1:02}{0}"
-        cmd = cmd.format(command, channel)
+    # Called with _dispatch_lock held.  Sends every command that is due.  Returns the number of seconds until the
+    # next command may be sent, or None if the queue is empty or the object has been closed.  An exception, such
+    # as a failed write or an OSError from a FilePacer, propagates with _lock released.
+    def _dispatch_ready(self):
+        self._lock.acquire()
+        try:
+            while not self._closed.isSet():
+                now = self._clock.now()
+                entry, sleep_time = self._next_command(now)
+                if entry is not None:
+                    self._lock.release()
+                    try:
+                        self._send(entry)
+                    finally:
+                        self._lock.acquire()
+                elif sleep_time is None:
+                    if self._metrics is not None:
+                        self._metrics.idle()
+                    break
+                else:
+                    if self._metrics is not None:
+                        self._metrics.slept(now, sleep_time)
+                    return sleep_time
+            self._queue_is_empty.set()
+            self._check_queue.clear()
+            return None
+        finally:
+            self._lock.release()
 
+    def _publish(self, entries):
+        if not entries:
+            return []
+        assert not self._closed.isSet()
         with self._lock:
-            self._command_queue.append(cmd)
+            if self._metrics is not None or self._recorder is not None:
+                now = self._clock.now()
+                for entry in entries:
+                    entry.queued = now
+            queued, futures = self._put(entries)
+            if self._metrics is not None:
+                self._metrics.queued(len(entries))
+            if self._journal is not None:
+                self._journal.enqueued(queued)
             self._queue_is_empty.clear()
             self._check_queue.set()
 
-        if self._thread is None:
+        if self._dispatcher is not None:
+            self._dispatcher.wake(self)
+        elif self._thread is None:
             self._process_command_queue()
+        return futures
 
-    def up(self, channels):
-        """Send an up command to one or more channels
+    def up(self, channels, priority=None):
+        """Send an up command to one or more channels.  Returns a list with a concurrent.futures.Future for
+        each channel.  A future's result is the clock time at which its command was written.  Cancelling a
+        future while its command is still queued prevents the command from being sent.
 
         Keyword arguments:
-        channels - can be None, a single integer, or a collection of integer channel values"""
-        self._do_command("U", channels)
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("U", channels, priority)
 
-    def down(self, channels):
-        """Send a down command to one or more channels
+    def down(self, channels, priority=None):
+        """Send a down command to one or more channels.  Returns a list with a concurrent.futures.Future for
+        each channel.  A future's result is the clock time at which its command was written.  Cancelling a
+        future while its command is still queued prevents the command from being sent.
 
         Keyword arguments:
-        channels - can be None, a single integer, or a collection of integer channel values"""
-        self._do_command("D", channels)
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("D", channels, priority)
 
-    def stop(self, channels):
-        """Send a stop command to one or more channels
+    def stop(self, channels, priority=None):
+        """Send a stop command to one or more channels.  Returns a list with a concurrent.futures.Future for
+        each channel.  A future's result is the clock time at which its command was written.  Cancelling a
+        future while its command is still queued prevents the command from being sent.
 
         Keyword arguments:
-        channels - can be None, a single integer, or a collection of integer channel values"""
-        self._do_command("S", channels)
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("S", channels, priority)
+
+    def acknowledgement(self, future):
+        """Returns a concurrent.futures.Future whose result is the number of seconds between the start of the
+        write of a command and the controller's response to it.  Requires acks=True.
+
+        If the controller responds to a later command first, or the object is closed before a response, the
+        future fails with NotAcknowledged.  It is cancelled if the command is never sent.
+
+        Keyword arguments:
+        future - one of the futures returned by up(), down(), stop(), or submit()"""
+        assert self._acks is not None
+        return self._acks.acknowledgement(future)
 
     def clear_command_queue(self):
-        """Discard any pending commands."""
+        """Discard any pending commands.  A command that is already being written to the port is not affected."""
         assert not self._closed.isSet()
         with self._lock:
             # No need to clear _check_command_queue since process loop will clear it for us.  Avoid potential race
-            self._command_queue = []
+            if self._metrics is not None:
+                self._metrics.cleared += len(self._command_queue)
+            if self._listeners is not None:
+                self._trace_discarded(CLEARED)
+            self._command_queue.clear()
             self._queue_is_empty.set()
 
     def flush_command_queue(self, timeout=None):
-        """Process any pending commands. returns True and does nothing for objects created with 'thread=False'.
+        """Process any pending commands. returns True and does nothing for objects created with 'thread=False'
+        and no dispatcher.
 
         returns True if all commands are processed.  False indicates timeout."""
         assert not self._closed.isSet()
@@ -154,11 +525,28 @@ class SomfyRTS:
 
         with self._lock:
             self._closed.set()
-            self._command_queue = []
+            if self._metrics is not None:
+                self._metrics.cleared += len(self._command_queue)
+            if self._listeners is not None:
+                self._trace_discarded(CLOSED)
+            self._command_queue.clear()
             self._queue_is_empty.set()
             self._check_queue.set()
 
         if self._thread is not None:
             self._thread.join()
+        if self._dispatcher is not None:
+            self._dispatcher.remove(self)
+
+        if self._reader is not None:
+            self._ser.cancel_read()
+            self._reader.join()
 
-        self._ser.close()
+        # Wait for any write in progress on a caller's thread before closing the port.
+        with self._dispatch_lock:
+            self._ser.close()
+        # Closed last so that the commands discarded above, and a write that was in progress, are retired.
+        if self._journal is not None:
+            self._journal.close()
+        if self._acks is not None:
+            self._acks.close()
@@ -10,15 +10,48 @@
 Send motor control commands for Somfy RTS devices through Somfy Universal RTS controller
 """
 import argparse
-import time
-
-from somfyrts import SomfyRTS
-from somfyrts.serialstub import SerialStub
+import os
+import sys
 
 import logging
 logger = logging.getLogger(__name__)
 
-if __name__ == "__main__":
+# The command line is started from latency sensitive places such as button handlers, so only what every
+# invocation needs is imported above.  pyserial, the daemon, and the rest are imported by the branches that use
+# them.  python3 -m benchmarks.bench_startup measures the result.
+
+
+def stream_commands(execute, path):
+    """Passes each line read from path ('-' for standard input) to execute(line) as soon as it arrives.  A FIFO
+    is reopened whenever its writer closes it, so other programs can keep sending commands."""
+    import stat
+    from somfyrts.protocol import ProtocolError
+    while True:
+        source = sys.stdin if path == "-" else open(path)
+        try:
+            for line in iter(source.readline, ""):
+                try:
+                    reply = execute(line)
+                except (ProtocolError, AssertionError) as error:
+                    reply = "ERR {0}".format(str(error) or "invalid command")
+                if reply != "OK":
+                    logger.error("{0}: {1}".format(line.strip(), reply))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        if path == "-" or not stat.S_ISFIFO(os.stat(path).st_mode):
+            return
+
+
+def open_port(port):
+    """Returns port unchanged, or a SerialStub for the port name 'TEST'"""
+    if port == "TEST":
+        from somfyrts.serialstub import SerialStub
+        return SerialStub()
+    return port
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.description = "Send up, down, and stop commands to specified channels through Somfy Universal RTS Interface"
     parser.usage = "python3 -m somfyrts <port> [-h] [options]"
@@ -34,24 +67,112 @@ if __name__ == "__main__":
     parser.add_argument('-interval', type=float, default=1.5,
                         help="number of seconds to delay between sending commands (default is 1.5)")
     parser.add_argument('-pause', action='store_true',
-                        help='pause [interval] seconds before sending first command')
+                        help='pause [interval] seconds before sending first command (ignored when a daemon is used)')
+    parser.add_argument('-pacefile', type=str, metavar="PATH",
+                        help="keep [interval] seconds between commands sent by every process using the file PATH")
+    parser.add_argument('-stream', '--stream', nargs='?', const="-", metavar="FIFO",
+                        help="after other commands, read commands such as 'U 3', 'D 1-5', or 'S all', one per line, "
+                             "from standard input or FIFO and send each as it arrives")
+    parser.add_argument('-daemon', action='store_true',
+                        help="keep the port open and accept commands from other invocations through a socket")
+    parser.add_argument('-socket', type=str, metavar="PATH",
+                        help="UNIX domain socket of the daemon (default is derived from the port name)")
+    parser.add_argument('-metrics', type=int, metavar="HTTPPORT",
+                        help="with -daemon, serve Prometheus metrics at http://127.0.0.1:HTTPPORT/metrics")
+    parser.add_argument('-nodaemon', action='store_true',
+                        help="open the port directly even if a daemon is running")
     parser.add_argument('-verbose', action='store_true',
                         help="verbose output")
     parser.add_argument("port", type=str, help="url of serial port for rts controller communication")
     parser.epilog = "Valid channel numbers are 1 through 5 for a version one controller and 1 through 16 " + \
                     "for the version II controller.  For testing purposes the port name 'TEST' can be used."
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG)
 
+    rf_domain = None
+    if args.pacefile:
+        from somfyrts.pacing import FilePacer
+        rf_domain = FilePacer(args.pacefile, args.interval)
+
+    if args.daemon:
+        import signal
+        from somfyrts import SomfyRTS
+        from somfyrts.daemon import SomfyRTSDaemon, default_socket_path
+        socket_path = args.socket or default_socket_path(args.port)
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt()
+        signal.signal(signal.SIGTERM, terminate)
+
+        with SomfyRTS(open_port(args.port), interval=args.interval, version=args.cmdver, thread=True,
+                      rf_domain=rf_domain, metrics=args.metrics is not None) as rts:
+            metrics_server = None
+            if args.metrics is not None:
+                from somfyrts.prometheus import MetricsServer
+                metrics_server = MetricsServer({args.port: rts.metrics}, ("127.0.0.1", args.metrics)).start()
+                logger.info("serving metrics on port {0}".format(metrics_server.server_address[1]))
+            rts.stop(args.stop)
+            rts.up(args.up)
+            rts.down(args.down)
+            try:
+                with SomfyRTSDaemon(rts, socket_path) as server:
+                    logger.info("listening on {0}".format(socket_path))
+                    try:
+                        server.serve_forever()
+                    except KeyboardInterrupt:
+                        pass
+            finally:
+                if metrics_server is not None:
+                    metrics_server.close()
+        return 0
+
+    if not args.nodaemon and os.name == "posix":     # UNIX domain sockets are POSIX only
+        from somfyrts.protocol import default_socket_path
+        socket_path = args.socket or default_socket_path(args.port)
+    else:
+        socket_path = None
+    client = None
+    if socket_path is not None and os.path.exists(socket_path):
+        from somfyrts.daemon import DaemonClient
+        try:
+            client = DaemonClient(socket_path)
+        except OSError:
+            logger.info("no daemon answering on {0}, opening port".format(socket_path))
+    if client is not None:
+        # Once connected the daemon may already have queued some of the commands, so a failure from here on is
+        # reported rather than retried on the port, which would send those commands twice.
+        try:
+            with client:
+                client.stop(args.stop)
+                client.up(args.up)
+                client.down(args.down)
+                if args.stream:
+                    stream_commands(client.request, args.stream)
+        except OSError as error:
+            logger.error("daemon on {0} failed, later commands were not sent: {1}".format(socket_path, error))
+            return 1
+        logger.info("commands queued by daemon on {0}".format(socket_path))
+        return 0
+
     if args.pause:
+        import time
         logger.info("pausing {0} seconds before sending first command".format(args.interval))
         time.sleep(args.interval)
 
-    port = args.port if args.port != "TEST" else SerialStub()
-
-    with SomfyRTS(port, interval=args.interval, version=args.cmdver) as rts:
+    from somfyrts import SomfyRTS
+    with SomfyRTS(open_port(args.port), interval=args.interval, version=args.cmdver,
+                  thread=args.stream is not None, rf_domain=rf_domain) as rts:
         rts.stop(args.stop)
         rts.up(args.up)
         rts.down(args.down)
+        if args.stream:
+            from somfyrts.protocol import execute_command
+            stream_commands(lambda line: execute_command(rts, line), args.stream)
+            rts.flush_command_queue()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# asyncio interface to the Universal RTS Interface.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Send motor control commands for Somfy RTS devices from asyncio code
+"""
+import asyncio
+
+from somfyrts import SomfyRTSBase
+from somfyrts.events import CLEARED, CLOSED
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# up(), down(), and stop() are usually called without awaiting their result.  Retrieving the exception of a
+# discarded or failed command keeps asyncio from logging it as never retrieved.
+def _retrieve_exception(future):
+    if not future.cancelled():
+        future.exception()
+
+
+class _LoopClock:
+    """Paces commands with the event loop's own monotonic clock"""
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def now(self):
+        return self._loop.time()
+
+
+class AsyncSomfyRTS(SomfyRTSBase):
+    """Sends commands to a Somfy Universal RTS Interface device from an asyncio event loop.
+
+    Commands are paced with event loop timers rather than a worker thread.  The object must only be used from
+    the thread running its event loop.  The awaitables returned by up(), down(), and stop() need not be
+    awaited."""
+
+    def __init__(self, port, interval=1.5, version=1, queue_capacity=None, coalesce=False, loop=None,
+                 rf_domain=None):
+        """Opens the specified port and initializes the RTS interface object.
+
+        Keyword arguments:
+        port -- either a url for serial port to open or an open serial port instance
+        version -- either 1 or 2 depending on model of Universal RTS Interface
+        queue_capacity -- maximum number of pending commands (None for no limit).  Adding a command to a full
+                          queue raises CommandQueueFull
+        coalesce -- if True a new command for a channel replaces that channel's pending command rather than
+                    being queued behind it
+        loop -- event loop used for timers.  Defaults to the running event loop
+        rf_domain -- an RFDomain, or the name of one, shared with other controllers in the same radio
+                     environment.  Every controller in the domain must run on the same event loop"""
+        self._loop = asyncio.get_running_loop() if loop is None else loop
+        super().__init__(port, interval, version, queue_capacity, coalesce, _LoopClock(self._loop), rf_domain)
+        self._timer = None
+        self._closed = False
+        self._queue_is_empty = asyncio.Event()
+        self._queue_is_empty.set()
+
+    async def __aenter__(self):
+        """Performs no function.  Returns original AsyncSomfyRTS object (self)."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Closes the serial port and cancels any pending commands."""
+        await self.close()
+
+    # Timer callback.  Sends every command that is due and schedules itself for the next interval slot.
+    def _process_command_queue(self):
+        self._timer = None
+        while not self._closed:
+            entry, sleep_time = self._next_command(self._clock.now())
+            if entry is not None:
+                try:
+                    self._send(entry)
+                except Exception:
+                    # The awaitable of the command that failed holds the error.  Carry on with the rest.
+                    logger.exception("error while sending commands")
+            elif sleep_time is None:
+                break
+            else:
+                logger.info("sleeping %s seconds between commands", sleep_time)
+                self._timer = self._loop.call_later(sleep_time, self._process_command_queue)
+                return
+        self._queue_is_empty.set()
+
+    def _publish(self, entries):
+        assert not self._closed
+        _, futures = self._put(entries)
+        futures = [asyncio.wrap_future(future, loop=self._loop) for future in futures]
+        if futures:
+            self._queue_is_empty.clear()
+            if self._timer is None:
+                self._timer = self._loop.call_soon(self._process_command_queue)
+        gathered = asyncio.gather(*futures)
+        gathered.add_done_callback(_retrieve_exception)
+        return gathered
+
+    def up(self, channels, priority=None):
+        """Queue an up command for one or more channels.  Returns an awaitable that completes with a list of
+        the loop times at which each command was written.
+
+        Keyword arguments:
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("U", channels, priority)
+
+    def down(self, channels, priority=None):
+        """Queue a down command for one or more channels.  Returns an awaitable that completes with a list of
+        the loop times at which each command was written.
+
+        Keyword arguments:
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("D", channels, priority)
+
+    def stop(self, channels, priority=None):
+        """Queue a stop command for one or more channels.  Returns an awaitable that completes with a list of
+        the loop times at which each command was written.
+
+        Keyword arguments:
+        channels - can be None, a single integer, or a collection of integer channel values
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self._do_command("S", channels, priority)
+
+    async def clear_command_queue(self):
+        """Discard any pending commands.  Awaitables for discarded commands are cancelled."""
+        assert not self._closed
+        if self._listeners is not None:
+            self._trace_discarded(CLEARED)
+        self._command_queue.clear()
+        self._queue_is_empty.set()
+
+    async def flush_command_queue(self, timeout=None):
+        """Wait for all pending commands to be sent.
+
+        returns True if all commands are processed.  False indicates timeout."""
+        assert not self._closed
+        try:
+            await asyncio.wait_for(self._queue_is_empty.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self):
+        """Cancels pending commands and closes the associated serial port"""
+        assert not self._closed
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._listeners is not None:
+            self._trace_discarded(CLOSED)
+        self._command_queue.clear()
+        self._queue_is_empty.set()
+        self._ser.close()
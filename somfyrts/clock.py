@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Time sources used to pace commands.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Clocks used by SomfyRTS to schedule commands
+"""
+import threading
+import time
+
+
+class MonotonicClock:
+    """Default clock.  Uses time.monotonic() so that wall clock changes (NTP, daylight saving time) can not
+    stall or burst the command queue.
+
+    A clock provides now(), returning seconds as a float, and wait(event, timeout) which blocks until the
+    event is set or timeout seconds have passed on that clock."""
+
+    @staticmethod
+    def now():
+        return time.monotonic()
+
+    @staticmethod
+    def wait(event, timeout=None):
+        return event.wait(timeout=timeout)
+
+    @staticmethod
+    def attach(thread):
+        pass
+
+
+class VirtualClock:
+    """Clock for tests and simulations.  Time only moves when the clock is advanced, so pacing can be checked
+    deterministically without spending wall clock time.
+
+    In manual mode (the default) threads that wait on the clock block until advance() or advance_to() moves
+    time past their deadline.  advance_to() steps time from one pending deadline to the next and, before
+    each step, waits for every attached thread to block on the clock again.  Worker threads that use the
+    clock must be passed to attach() after they have been started.
+
+    With auto_advance=True a wait with a timeout returns immediately after moving time forward by the timeout.
+    This suits a single dispatcher, for example SomfyRTS created with thread=False, and runs thousands of
+    scheduling scenarios per second."""
+
+    def __init__(self, start=0.0, auto_advance=False, poll_interval=0.001):
+        """Creates a clock.
+
+        Keyword arguments:
+        start -- initial time in seconds
+        auto_advance -- if True, wait() advances time itself instead of waiting for advance()
+        poll_interval -- real seconds between checks of a waiting thread's event"""
+        self._now = float(start)
+        self._auto_advance = auto_advance
+        self._poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._threads = []
+        self._waiters = {}
+
+    def now(self):
+        return self._now
+
+    def attach(self, thread):
+        """Registers a started thread that waits on this clock so advance() knows to wait for it"""
+        with self._cond:
+            self._threads.append(thread)
+
+    def wait(self, event, timeout=None):
+        with self._cond:
+            if self._auto_advance and timeout is not None:
+                if not event.is_set():
+                    self._now += timeout
+                return event.is_set()
+            deadline = None if timeout is None else self._now + timeout
+            me = threading.current_thread()
+            self._waiters[me] = (deadline, event)
+            self._cond.notify_all()
+            try:
+                while not event.is_set() and (deadline is None or self._now < deadline):
+                    self._cond.wait(self._poll_interval)
+            finally:
+                del self._waiters[me]
+                self._cond.notify_all()
+            return event.is_set()
+
+    def advance(self, seconds):
+        """Moves time forward by seconds, waking waiting threads in deadline order"""
+        self.advance_to(self._now + seconds)
+
+    def advance_to(self, when):
+        """Moves time forward to when, waking waiting threads in deadline order"""
+        with self._cond:
+            while True:
+                self._wait_until_idle()
+                due = [deadline for deadline, _ in self._waiters.values() if deadline is not None and deadline <= when]
+                if not due:
+                    break
+                self._now = min(due)
+                self._cond.notify_all()
+            if when > self._now:
+                self._now = when
+
+    # Called with self._cond held.  Returns once every attached thread that is still running is blocked in
+    # wait() with nothing left to do at the current time.
+    def _wait_until_idle(self):
+        while True:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            busy = any(t not in self._waiters for t in self._threads)
+            if not busy:
+                busy = any(event.is_set() or (deadline is not None and deadline <= self._now)
+                           for deadline, event in self._waiters.values())
+            if not busy:
+                return
+            self._cond.wait(self._poll_interval)
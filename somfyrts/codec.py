@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Command encoding for each Universal RTS Interface version.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Encodes commands into the bytes sent to a Somfy Universal RTS Interface
+"""
+
+COMMANDS = ('U', 'D', 'S')
+
+
+class CommandCodec:
+    """Precomputed table of ready-to-write bytes for every command and channel of one controller version.
+
+    The table is built once, so encoding a command is a lookup that returns a shared bytes object."""
+
+    def __init__(self, channel_count, frame_format, commands=COMMANDS):
+        """Builds the table.
+
+        Keyword arguments:
+        channel_count -- channels are numbered 1 through channel_count
+        frame_format -- str.format() pattern with the command as {0} and channel number as {1}
+        commands -- command letters supported by the controller"""
+        self.channel_count = channel_count
+        self.commands = tuple(commands)
+        # Index 0 is unused so channel numbers index the tuples directly.
+        self._table = {command: (None,) + tuple(bytes(frame_format.format(command, channel), "ascii")
+                                                for channel in range(1, channel_count + 1))
+                       for command in self.commands}
+        self._frames = {self._table[command][channel]: (command, channel)
+                        for command in self.commands for channel in range(1, channel_count + 1)}
+
+    def is_valid(self, command, channel):
+        """Returns True if the command and channel can be encoded"""
+        return command in self._table and 1 <= channel <= self.channel_count
+
+    def encode(self, command, channel):
+        """Returns the bytes to write for command on channel"""
+        return self._table[command][channel]
+
+    def decode(self, frame):
+        """Returns the (command, channel) tuple encoded by frame, or None if frame is not a command"""
+        return self._frames.get(bytes(frame))
+
+    @property
+    def frames(self):
+        """Every encoded frame.  Used to recognize frames echoed by the controller."""
+        return self._frames.keys()
+
+
+_codecs = {
+    1: CommandCodec(5, "{0}{1}\r"),
+    # TODO:  The documentation for version II controller does not show a terminating \r for commands.  Because
+    # TODO:  the author does not have a version II controller, he is unable to verify if this is correct.
+    # TODO:  If a future user finds the answer, please either correct this code by adding a trailing \r and
+    # TODO:  correcting test_version_2() or if a trailing \r is not required, please remove these comments.
+    2: CommandCodec(16, "01{1:02}{0}"),
+}
+
+
+def register_codec(version, codec):
+    """Adds or replaces the codec used for a controller version"""
+    _codecs[version] = codec
+
+
+def get_codec(version):
+    """Returns the CommandCodec for a controller version.  Raises KeyError for unknown versions."""
+    return _codecs[version]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Pending command queue used by SomfyRTS.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Queue of pending commands waiting to be sent to a Somfy Universal RTS Interface
+"""
+from collections import deque
+from concurrent.futures import Future
+import threading
+
+# Priority classes.  Lower numbers are dispatched first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+
+class CommandQueueFull(Exception):
+    """Raised when a command is added to a bounded CommandQueue that is already at capacity"""
+    pass
+
+
+class CommandFuture(Future):
+    """The concurrent.futures.Future of a queued command.
+
+    A Future creates a threading.Condition, with its lock about 1.5 KB, when it is constructed.  This one
+    creates the condition the first time any method needs it, which for most commands is when they are sent,
+    so a deep queue costs little more than its QueuedCommand objects.
+
+    Doing so means setting the attributes Future.__init__() would.  When this module is imported a plain Future
+    is checked to hold exactly the attributes expected, with their usual initial values.  If a Python release
+    changes them, every CommandFuture is initialized by Future.__init__() instead and only the saving is lost."""
+
+    _create_lock = threading.Lock()
+
+    def __init__(self):
+        if _INITIAL_STATE is None:
+            super().__init__()
+            return
+        self._lazy_condition = None
+        self._state = _INITIAL_STATE
+        self._result = None
+        self._exception = None
+        self._waiters = []
+        self._done_callbacks = []
+
+    @property
+    def _condition(self):
+        condition = self._lazy_condition
+        if condition is None:
+            with CommandFuture._create_lock:
+                condition = self._lazy_condition
+                if condition is None:
+                    condition = self._lazy_condition = threading.Condition()
+        return condition
+
+    @_condition.setter
+    def _condition(self, condition):
+        self._lazy_condition = condition
+
+
+# Attributes CommandFuture.__init__() sets in place of Future.__init__(), with the initial value of each except
+# _condition and _state.
+_FUTURE_ATTRIBUTES = {'_condition': None, '_state': None, '_result': None, '_exception': None, '_waiters': [],
+                      '_done_callbacks': []}
+
+
+# Returns the state of a new Future if Future.__init__() sets exactly _FUTURE_ATTRIBUTES, otherwise None.
+def _initial_state():
+    future = Future()
+    attributes = vars(future)
+    if set(attributes) != set(_FUTURE_ATTRIBUTES) or not isinstance(attributes['_condition'], threading.Condition):
+        return None
+    for name, value in _FUTURE_ATTRIBUTES.items():
+        if name not in ('_condition', '_state') and attributes[name] != value:
+            return None
+    return attributes['_state']
+
+
+_INITIAL_STATE = _initial_state()
+
+
+class QueuedCommand:
+    """A single pending command.  Slots keep the per-entry footprint small for deep queues.
+
+    An entry whose data is None has been superseded and is skipped when it reaches the head of its lane.
+    future is None or a concurrent.futures.Future that is cancelled if the command is discarded.  queued is the
+    clock time the command was queued when something measures it, otherwise None."""
+    __slots__ = ('channel', 'command', 'data', 'priority', 'future', 'queued')
+
+    def __init__(self, channel, command, data, priority=PRIORITY_NORMAL, future=None):
+        self.channel = channel
+        self.command = command
+        self.data = data
+        self.priority = priority
+        self.future = future
+        self.queued = None
+
+    def __repr__(self):
+        return "QueuedCommand({0!r}, {1!r}, {2!r}, {3!r})".format(self.channel, self.command, self.data,
+                                                                   self.priority)
+
+
+class CommandQueue:
+    """Priority queue of QueuedCommand objects with O(1) put() and get().
+
+    Each priority class has its own first in, first out lane.  get() always returns the oldest command from
+    the highest priority lane that has one.
+
+    When created with coalesce=True the queue holds at most one command per channel.  A new command for a
+    channel that already has a pending command replaces the pending one in place, keeping its position in
+    the queue.  If the priorities differ the pending command is discarded and the new one is queued in its
+    own lane.  A channel index makes this check O(1).  The future of a replaced command is cancelled and a
+    dropped duplicate shares the future of the pending command, unless that future was cancelled, in which
+    case the duplicate replaces the pending command.
+
+    The queue does no locking of its own.  SomfyRTS only touches it while holding its lock."""
+
+    def __init__(self, capacity=None, coalesce=False):
+        """Creates an empty queue.
+
+        Keyword arguments:
+        capacity -- maximum number of pending commands, or None for no limit
+        coalesce -- if True a new command for a channel supersedes that channel's pending command"""
+        assert capacity is None or capacity > 0
+        self._capacity = capacity
+        self._lanes = tuple(deque() for _ in PRIORITIES)
+        self._count = 0
+        self._channel_index = {} if coalesce else None
+        self.replaced = 0   # pending commands overwritten by a different command for the same channel
+        self.dropped = 0    # new commands discarded because an identical command was already pending
+        self.on_superseded = None   # called with a pending entry just before a new command replaces it
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        """Iterates over the pending commands in the order get() would return them"""
+        for lane in self._lanes:
+            for entry in lane:
+                if entry.data is not None:
+                    yield entry
+
+    @property
+    def capacity(self):
+        """Maximum number of pending commands or None if the queue is unbounded"""
+        return self._capacity
+
+    @property
+    def coalesce(self):
+        """True if new commands supersede pending commands for the same channel"""
+        return self._channel_index is not None
+
+    def put(self, entry):
+        """Adds a command to the end of the queue.  Raises CommandQueueFull if the queue is at capacity.
+
+        In coalescing mode, returns the pending entry that now holds the command if the channel already had
+        one queued, otherwise returns entry."""
+        if self._channel_index is not None:
+            pending = self._channel_index.get(entry.channel)
+            if pending is not None:
+                if pending.priority == entry.priority:
+                    # A pending command whose future was cancelled will never be sent, so it is replaced rather
+                    # than handing the new command a cancelled future.
+                    if pending.data == entry.data and not _cancelled(pending.future):
+                        self.dropped += 1
+                    else:
+                        if self.on_superseded is not None:
+                            self.on_superseded(pending)
+                        _cancel(pending.future)
+                        pending.command = entry.command
+                        pending.data = entry.data
+                        pending.future = entry.future
+                        self.replaced += 1
+                    return pending
+                # Different lane.  Leave a tombstone behind and queue the new command in its own lane.
+                if self.on_superseded is not None:
+                    self.on_superseded(pending)
+                _cancel(pending.future)
+                pending.data = None
+                self._count -= 1
+                self.replaced += 1
+        if self._capacity is not None and self._count >= self._capacity:
+            raise CommandQueueFull("command queue is full ({0} commands)".format(self._capacity))
+        self._lanes[entry.priority].append(entry)
+        self._count += 1
+        if self._channel_index is not None:
+            self._channel_index[entry.channel] = entry
+        return entry
+
+    def put_many(self, entries):
+        """Adds several commands in order.  Returns a list of the entries now holding the commands (see put()).
+
+        Raises CommandQueueFull without adding anything if the queue does not have room for all of them.  The
+        check does not account for coalescing so a batch that would coalesce into a full queue is refused."""
+        self.check_capacity(len(entries))
+        return [self.put(entry) for entry in entries]
+
+    def check_capacity(self, count):
+        """Raises CommandQueueFull if count more commands would not fit, ignoring coalescing"""
+        if self._capacity is not None and self._count + count > self._capacity:
+            raise CommandQueueFull("command queue is full ({0} commands)".format(self._capacity))
+
+    def peek(self):
+        """Returns the command get() would return without removing it, or None if the queue is empty"""
+        for lane in self._lanes:
+            while lane:
+                entry = lane[0]
+                if entry.data is not None:
+                    return entry
+                lane.popleft()
+        return None
+
+    def get(self):
+        """Removes and returns the next command to send.  The queue must not be empty."""
+        for lane in self._lanes:
+            while lane:
+                entry = lane.popleft()
+                if entry.data is not None:
+                    self._count -= 1
+                    if self._channel_index is not None:
+                        del self._channel_index[entry.channel]
+                    return entry
+        raise IndexError("get from an empty CommandQueue")
+
+    def clear(self):
+        """Discards all pending commands, cancelling their futures"""
+        for lane in self._lanes:
+            for entry in lane:
+                if entry.data is not None:
+                    _cancel(entry.future)
+            lane.clear()
+        self._count = 0
+        if self._channel_index is not None:
+            self._channel_index.clear()
+
+
+def _cancel(future):
+    if future is not None:
+        future.cancel()
+
+
+def _cancelled(future):
+    return future is not None and future.cancelled()
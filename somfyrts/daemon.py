@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Long running process that owns the serial port.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Share one SomfyRTS between many clients through a UNIX domain socket
+"""
+import os
+import socket
+import socketserver
+
+from somfyrts.protocol import ProtocolError, default_socket_path, execute_command, format_command
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Reads one command per line and answers each with 'OK' or 'ERR <message>'"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.execute(line.decode("ascii"))
+            except (ProtocolError, AssertionError, UnicodeDecodeError) as error:
+                reply = "ERR {0}".format(str(error) or "invalid command")
+            except Exception as error:
+                logger.exception("error executing %r", line)
+                reply = "ERR {0}".format(error)
+            self.wfile.write(reply.encode("ascii") + b"\n")
+            self.wfile.flush()
+
+
+class SomfyRTSDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Accepts text commands on a UNIX domain socket and queues them on a single SomfyRTS.
+
+    Every client shares the one queue and its pacing.  The SomfyRTS should be created with thread=True (or
+    a dispatcher) so that queueing a command returns as soon as it is in the queue."""
+
+    daemon_threads = True
+
+    def __init__(self, rts, path):
+        """Binds the socket.  Raises OSError if another daemon is already listening on path.
+
+        Keyword arguments:
+        rts -- the SomfyRTS that owns the serial port
+        path -- file system path of the UNIX domain socket"""
+        self.rts = rts
+        self.path = path
+        if os.path.exists(path):
+            if daemon_running(path):
+                raise OSError("a somfyrts daemon is already listening on {0}".format(path))
+            os.unlink(path)         # left behind by a daemon that did not shut down cleanly
+        super().__init__(path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def execute(self, line):
+        """Executes one protocol line and returns the reply"""
+        return execute_command(self.rts, line)
+
+
+class DaemonClient:
+    """Connection to a running SomfyRTSDaemon"""
+
+    def __init__(self, path, timeout=None):
+        """Connects to the daemon.  Raises OSError if no daemon is listening on path."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(path)
+        except:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def request(self, line):
+        """Sends one protocol line and returns the reply without its newline"""
+        self._file.write(line.encode("ascii") if line.endswith("\n") else (line + "\n").encode("ascii"))
+        self._file.flush()
+        reply = self._file.readline()
+        if not reply:
+            raise ConnectionError("somfyrts daemon closed the connection")
+        return reply.decode("ascii").rstrip("\n")
+
+    def _command(self, command, channels):
+        if channels is None:
+            return
+        if isinstance(channels, int):
+            channels = (channels,)
+        reply = self.request(format_command(command, channels))
+        if reply != "OK":
+            raise ProtocolError(reply)
+
+    def up(self, channels):
+        """Queue an up command for one or more channels on the daemon"""
+        self._command("U", channels)
+
+    def down(self, channels):
+        """Queue a down command for one or more channels on the daemon"""
+        self._command("D", channels)
+
+    def stop(self, channels):
+        """Queue a stop command for one or more channels on the daemon"""
+        self._command("S", channels)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def daemon_running(path):
+    """Returns True if a daemon answers on path"""
+    try:
+        with DaemonClient(path, timeout=1.0) as client:
+            return client.request("PING") == "OK"
+    except OSError:
+        return False
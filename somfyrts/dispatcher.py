@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# One worker thread shared by many SomfyRTS objects.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Process the command queues of many SomfyRTS objects on a single thread
+"""
+import heapq
+import itertools
+import threading
+
+from somfyrts.clock import MonotonicClock
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SharedDispatcher:
+    """A single thread that services any number of SomfyRTS objects created with dispatcher=.
+
+    The thread keeps a heap of (deadline, controller) pairs, one live entry per controller with pending
+    commands, and sleeps until the earliest deadline.  Idle controllers cost nothing but their queue."""
+
+    def __init__(self, clock=None):
+        """Starts the dispatcher thread.
+
+        Keyword arguments:
+        clock -- clock shared by the dispatcher and its controllers.  Defaults to MonotonicClock"""
+        self.clock = MonotonicClock() if clock is None else clock
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._heap = []
+        self._deadlines = {}        # controller -> deadline of its live heap entry
+        self._sequence = itertools.count()
+        self._closed = False
+        self._thread = threading.Thread(target=lambda: self._run(), name="SomfyRTS dispatcher")
+        self._thread.daemon = True
+        self._thread.start()
+        self.clock.attach(self._thread)
+
+    def __enter__(self):
+        """Performs no function.  Returns original SharedDispatcher object (self)."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops the dispatcher thread."""
+        self.close()
+
+    def wake(self, rts):
+        """Schedules rts to be serviced as soon as possible.  Called by SomfyRTS after queueing commands."""
+        self._schedule(rts, self.clock.now())
+
+    def remove(self, rts):
+        """Stops servicing rts.  Called by SomfyRTS.close()."""
+        with self._lock:
+            self._deadlines.pop(rts, None)
+
+    def close(self):
+        """Stops the dispatcher thread.  Controllers using it must be closed first."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.set()
+        self._thread.join()
+
+    def _schedule(self, rts, deadline):
+        with self._lock:
+            current = self._deadlines.get(rts)
+            if current is not None and current <= deadline:
+                return
+            # Any older heap entry for rts is now stale and will be skipped when popped.
+            self._deadlines[rts] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._sequence), rts))
+            if self._heap[0][2] is rts:
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                self._wakeup.clear()
+                now = self.clock.now()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, _, rts = heapq.heappop(self._heap)
+                    if self._deadlines.get(rts) == deadline:
+                        del self._deadlines[rts]
+                        due.append(rts)
+                timeout = self._heap[0][0] - now if self._heap else None
+
+            for rts in due:
+                try:
+                    with rts._dispatch_lock:
+                        sleep_time = rts._dispatch_ready()
+                except Exception:
+                    # The future of the command that failed holds the error.  Carry on with the rest of the queue.
+                    logger.exception("error while dispatching commands")
+                    sleep_time = 0.0
+                if sleep_time is not None:
+                    self._schedule(rts, self.clock.now() + sleep_time)
+
+            if not due:
+                self.clock.wait(self._wakeup, timeout)
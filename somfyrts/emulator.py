@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Emulated controller on a pseudo-terminal for end to end testing.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Emulates a Somfy Universal RTS Interface on a Linux pseudo-terminal so the real serial port path can be tested
+"""
+import os
+import select
+import termios
+import threading
+import time
+import tty
+
+from somfyrts.codec import get_codec
+from somfyrts.responses import ResponseParser
+
+import logging
+logger = logging.getLogger(__name__)
+
+BITS_PER_BYTE = 10      # 8N1: start bit, eight data bits, stop bit
+DEFAULT_TOLERANCE = 0.02    # seconds, above the usual scheduling jitter of a busy machine
+_SPEEDS = {getattr(termios, name): int(name[1:]) for name in dir(termios) if name[0] == 'B' and name[1:].isdigit()}
+
+
+class ReceivedFrame:
+    """A command frame read by ControllerEmulator.
+
+    time is the monotonic clock time the last byte of the frame finished arriving at the emulated baud rate.
+    gap is the seconds since the previous frame, or None for the first.  too_soon is True if gap is shorter than
+    the interval the emulator was created with by more than its tolerance.  line_ok is False if the port was not
+    set to the expected baud rate, 8 data bits, no parity, and one stop bit when the frame arrived."""
+    __slots__ = ('time', 'command', 'channel', 'gap', 'too_soon', 'line_ok')
+
+    def __init__(self, time, command, channel, gap, too_soon, line_ok):
+        self.time = time
+        self.command = command
+        self.channel = channel
+        self.gap = gap
+        self.too_soon = too_soon
+        self.line_ok = line_ok
+
+    def __repr__(self):
+        return "ReceivedFrame({0!r}, {1}, time={2:.6f}, gap={3}, too_soon={4}, line_ok={5})".format(
+            self.command, self.channel, self.time, self.gap, self.too_soon, self.line_ok)
+
+
+class ControllerEmulator:
+    """Pseudo-terminal that behaves like the serial port of a Universal RTS Interface.
+
+    Pass the port attribute, a path such as /dev/pts/3, to SomfyRTS so commands go through pyserial and a real
+    file descriptor.  A thread reads the frames written in the framing of the controller version, decodes them,
+    and timestamps each one.  A pseudo-terminal delivers bytes immediately, so the emulator computes when each
+    byte would have finished arriving over a line running at baudrate, including bytes that queue up behind a
+    previous frame.  Frames that arrive closer together than interval are flagged as too_soon.
+
+    Linux only."""
+
+    def __init__(self, version=1, interval=1.5, baudrate=9600, tolerance=DEFAULT_TOLERANCE, echo=False):
+        """Opens the pseudo-terminal.  Call start(), or use the emulator in a with statement, to read from it.
+
+        Keyword arguments:
+        version -- controller version, which selects the framing: b'U1\\r' for 1 or b'0108U' for 2
+        interval -- minimum seconds expected between frames
+        baudrate -- line speed used to compute transmit times, and expected to be set on the port
+        tolerance -- seconds a gap may fall short of interval before the frame is flagged, to allow for the
+                     scheduling jitter of the sending and emulator threads.  It does not grow with interval, so
+                     a pacing error of more than tolerance is caught at any interval
+        echo -- if True each frame is written back, like a controller acknowledging it"""
+        self._codec = get_codec(version)
+        self._parser = ResponseParser(self._codec)
+        self.interval = interval
+        self.baudrate = baudrate
+        self.tolerance = tolerance
+        self.echo = echo
+        self._byte_time = BITS_PER_BYTE / baudrate
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)     # no echo or newline translation of the frames
+        # The emulator keeps the slave open so that reads of the master do not fail while no client has it open.
+        self.port = os.ttyname(self._slave)
+        self._wake_read, self._wake_write = os.pipe()
+        self._cond = threading.Condition()
+        self._frames = []
+        self._line_free = 0.0       # time the emulated line finishes the bytes received so far
+        self._thread = None
+
+    def __enter__(self):
+        """Starts the emulator.  Returns original ControllerEmulator object (self)."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops the emulator and closes the pseudo-terminal."""
+        self.close()
+
+    @property
+    def frames(self):
+        """List of the ReceivedFrame objects read so far, oldest first"""
+        with self._cond:
+            return list(self._frames)
+
+    @property
+    def too_soon(self):
+        """List of the frames that arrived closer together than interval"""
+        return [frame for frame in self.frames if frame.too_soon]
+
+    @property
+    def discarded(self):
+        """Number of bytes read that were not part of a frame"""
+        return self._parser.discarded
+
+    def line_settings(self):
+        """Returns (baudrate, bytesize, parity, stopbits) as currently set on the port by its user.  baudrate is
+        None for a speed termios has no constant for.  The Linux pseudo-terminal driver forces 8 data bits and no
+        parity, so only the baud rate and stop bits reflect what the user set."""
+        _, _, cflag, _, _, ospeed, _ = termios.tcgetattr(self._slave)
+        bytesize = {termios.CS5: 5, termios.CS6: 6, termios.CS7: 7, termios.CS8: 8}[cflag & termios.CSIZE]
+        parity = 'N' if not cflag & termios.PARENB else 'O' if cflag & termios.PARODD else 'E'
+        stopbits = 2 if cflag & termios.CSTOPB else 1
+        return _SPEEDS.get(ospeed), bytesize, parity, stopbits
+
+    def wait_for(self, count, timeout=None):
+        """Blocks until count frames have been read.  Returns False if timeout seconds pass first."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._frames) >= count, timeout)
+
+    def start(self):
+        """Starts the thread reading the pseudo-terminal"""
+        assert self._thread is None
+        self._thread = threading.Thread(target=self._thread_read, name="somfyrts-emulator", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the reading thread and closes the pseudo-terminal"""
+        if self._thread is not None:
+            os.write(self._wake_write, b'x')
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave, self._wake_read, self._wake_write):
+            os.close(fd)
+
+    def _thread_read(self):
+        while True:
+            readable, _, _ = select.select([self._master, self._wake_read], [], [])
+            if self._wake_read in readable:
+                return
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                logger.exception("read of emulated controller failed")
+                return
+            self._received(data, time.monotonic())
+
+    # Called by the reading thread with bytes read at time now.
+    def _received(self, data, now):
+        line_ok = None
+        for byte in data:
+            # Each byte starts when the line is free and takes BITS_PER_BYTE bit times.
+            self._line_free = max(self._line_free, now) + self._byte_time
+            for command, channel in self._parser.feed(bytes((byte,))):
+                if line_ok is None:
+                    line_ok = self.line_settings() == (self.baudrate, 8, 'N', 1)
+                self._frame(command, channel, self._line_free, line_ok)
+
+    def _frame(self, command, channel, now, line_ok):
+        with self._cond:
+            gap = now - self._frames[-1].time if self._frames else None
+            too_soon = gap is not None and gap < self.interval - self.tolerance
+            frame = ReceivedFrame(now, command, channel, gap, too_soon, line_ok)
+            self._frames.append(frame)
+            self._cond.notify_all()
+        if too_soon:
+            logger.warning("emulated controller received %s %d %.6f seconds after the previous command",
+                           command, channel, gap)
+        if self.echo:
+            os.write(self._master, self._codec.encode(command, channel))
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Names of the command lifecycle events.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Names of the steps in the life of a queued command, passed to listeners added with add_listener()
+"""
+
+# Every command starts with ENQUEUED and ends with exactly one of WRITTEN, FAILED, SUPERSEDED, CLEARED, CANCELLED,
+# or CLOSED.  This module imports nothing so that SomfyRTS can use the names without loading somfyrts.tracing.
+ENQUEUED = "enqueued"       # queued by up(), down(), stop(), or submit()
+SUPERSEDED = "superseded"   # replaced by, or merged into, another command for its channel (coalesce mode)
+DISPATCHED = "dispatched"   # given an interval slot and about to be written
+WRITTEN = "written"         # write to the port completed
+FAILED = "failed"           # write to the port raised an exception
+CLEARED = "cleared"         # discarded by clear_command_queue()
+CANCELLED = "cancelled"     # discarded because its future was cancelled
+CLOSED = "closed"           # discarded by close()
+FINAL_EVENTS = (WRITTEN, FAILED, SUPERSEDED, CLEARED, CANCELLED, CLOSED)
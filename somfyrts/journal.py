@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Persistent journal of queued commands.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Keeps queued commands on disk so that commands still pending when a process dies are sent by the next one
+"""
+import os
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CommandJournal:
+    """Append-only file of the commands queued by a SomfyRTS and of what became of them.
+
+    The file holds one record per line.  'E <id> <command> <channel> <priority>' is written when a command is
+    queued, 'D <id>' when it has been written to the port, and 'C <id>' when it is discarded.  A command with an
+    E record and neither of the others is live and is queued again when the journal is reopened.  A command
+    written just before a crash may be sent a second time, never not at all.
+
+    Records are collected in memory and a background thread writes and fsyncs each group of them at most every
+    sync_interval seconds, so queueing a command never waits for the disk.  Once the file holds more than
+    compact_threshold records, most of them for finished commands, it is rewritten with only the live ones."""
+
+    def __init__(self, path, sync_interval=0.05, compact_threshold=1000):
+        """Opens or creates the journal and starts the thread that writes it.
+
+        Keyword arguments:
+        path -- journal file.  Only one SomfyRTS may use a journal at a time
+        sync_interval -- longest time in seconds a record waits in memory.  Commands queued within this time
+                         of a crash may be lost
+        compact_threshold -- number of records in the file that triggers compaction"""
+        self.path = path
+        self._sync_interval = sync_interval
+        self._compact_threshold = compact_threshold
+        self._lock = threading.Lock()       # guards the in-memory state
+        self._io_lock = threading.Lock()    # serializes writes to the file
+        self._dirty = threading.Event()
+        self._closing = threading.Event()
+        self._closed = False
+        self._buffer = []
+        self._journaled = {}                # future of a live command -> its id
+        self._live, self._next_id = self._load(path)
+        self._recovered_below = self._next_id
+        # Start from a compacted file.  This also drops a record torn by a crash during a write, which would
+        # otherwise run into the next record appended.
+        self._fd = None
+        self._file_records = len(self._live)
+        self._compact(self._snapshot())
+        self._thread = threading.Thread(target=lambda: self._run(), name="SomfyRTS journal")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return "CommandJournal({0!r})".format(self.path)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._live)
+
+    def replay(self, submit):
+        """Queues the commands that were live when the journal was opened.
+
+        The commands are passed, in their original order, to submit(), which must journal them again through
+        enqueued(), as SomfyRTS.submit() does.  The original records are retired only after the new ones so a
+        crash in between can repeat commands but not lose them.  Returns the result of submit(), or an empty
+        list if there was nothing to replay.
+
+        Keyword arguments:
+        submit -- function accepting a list of (command, channel, priority) tuples"""
+        with self._lock:
+            recovered = [id for id in self._live if id < self._recovered_below]
+            commands = [self._live[id] for id in recovered]
+        if not commands:
+            return []
+        logger.info("replaying %s commands from %s", len(commands), self.path)
+        result = submit(commands)
+        with self._lock:
+            for id in recovered:
+                if self._live.pop(id, None) is not None:
+                    self._append("C {0}\n".format(id))
+        return result
+
+    def enqueued(self, entries):
+        """Records newly queued QueuedCommand entries.  Called with the queue protected so records are in queue
+        order.  An entry whose future has already been recorded, such as a coalesced duplicate, is skipped."""
+        journaled = []
+        with self._lock:
+            if self._closed:
+                return
+            for entry in entries:
+                future = entry.future
+                if future is None or future in self._journaled:
+                    continue
+                id = self._next_id
+                self._next_id += 1
+                self._journaled[future] = id
+                self._live[id] = (entry.command, entry.channel, entry.priority)
+                self._append("E {0} {1} {2} {3}\n".format(id, entry.command, entry.channel, entry.priority))
+                journaled.append((id, future))
+        # Outside the lock because a callback runs at once if its future is already done.
+        for id, future in journaled:
+            future.add_done_callback(lambda done, id=id: self._finished(id, done))
+
+    def flush(self):
+        """Writes and fsyncs every record collected so far"""
+        self._sync()
+
+    def close(self):
+        """Writes the remaining records and closes the file.  Commands still live stay in the journal and are
+        replayed by the next journal opened on the file.  SomfyRTS.close() discards its pending commands, which
+        retires them, before closing its journal."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._closing.set()
+        self._dirty.set()
+        self._thread.join()
+        self._sync()
+        os.close(self._fd)
+
+    # Called when the future of a journaled command completes, either because it was written or because it was
+    # cancelled by clear_command_queue(), coalescing, or the caller.
+    def _finished(self, id, future):
+        with self._lock:
+            if self._closed:
+                return
+            del self._journaled[future]
+            if self._live.pop(id, None) is not None:
+                self._append("{0} {1}\n".format("C" if future.cancelled() else "D", id))
+
+    # Called with _lock held.
+    def _append(self, record):
+        self._buffer.append(record)
+        self._file_records += 1
+        self._dirty.set()
+
+    def _run(self):
+        while not self._closing.isSet():
+            self._dirty.wait()
+            self._closing.wait(self._sync_interval)     # let a group of records collect
+            try:
+                self._sync()
+            except OSError:
+                logger.exception("error writing journal %s", self.path)
+
+    def _sync(self):
+        with self._io_lock:
+            with self._lock:
+                self._dirty.clear()
+                records, self._buffer = self._buffer, []
+                compact = self._file_records > self._compact_threshold and \
+                    self._file_records > 2 * len(self._live)
+                if compact:
+                    # The snapshot includes the effect of every record collected so far.
+                    records = self._snapshot()
+                    self._file_records = len(self._live)
+            if compact:
+                self._compact(records)
+            elif records:
+                _write(self._fd, records)
+                os.fsync(self._fd)
+
+    # Called with _lock held.  Returns an E record for every live command.
+    def _snapshot(self):
+        return ["E {0} {1} {2} {3}\n".format(id, *command) for id, command in self._live.items()]
+
+    # Replaces the file with one holding only the records given.  Called with _io_lock held or from __init__.
+    def _compact(self, records):
+        temporary = self.path + ".tmp"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            _write(fd, records)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temporary, self.path)
+        _fsync_directory(self.path)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        logger.debug("compacted journal %s to %s records", self.path, len(records))
+
+    # Reads the live commands from an existing journal.  Returns ({id: (command, channel, priority)}, next id).
+    # A torn record at the end of the file, left by a crash during a write, is ignored.
+    @staticmethod
+    def _load(path):
+        live = {}
+        next_id = 0
+        try:
+            with open(path, "r", encoding="ascii", errors="replace") as file:
+                for line in file:
+                    words = line.split()
+                    try:
+                        id = int(words[1])
+                        if words[0] == "E" and len(words) == 5:
+                            live[id] = (words[2], int(words[3]), int(words[4]))
+                        elif words[0] in ("D", "C") and len(words) == 2:
+                            live.pop(id, None)
+                        else:
+                            continue
+                    except (IndexError, ValueError):
+                        continue
+                    next_id = max(next_id, id + 1)
+        except FileNotFoundError:
+            pass
+        return live, next_id
+
+
+def _write(fd, records):
+    data = memoryview("".join(records).encode("ascii"))
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _fsync_directory(path):
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Counters and histograms describing how commands move through a SomfyRTS.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Measures queueing and dispatch of commands sent to a Somfy Universal RTS Interface
+"""
+from bisect import bisect_left
+
+# Upper bounds in seconds of the histogram buckets.  Queue times of a long scene run to minutes.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    """Counts observations in fixed buckets, like a Prometheus histogram.
+
+    The histogram does no locking of its own.  Every histogram of a Metrics object is only updated by code that
+    already holds the lock of its SomfyRTS for another reason, so measuring adds no lock acquisitions."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Keyword arguments:
+        buckets -- increasing upper bounds of the buckets.  A final bucket without a bound is added"""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Adds one observation"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Returns a dict with the count, the sum, and a list of (upper bound, cumulative count) pairs ending
+        with the bound float('inf')"""
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(self.counts)):
+            total += count
+            cumulative.append((bound, total))
+        return {"count": total, "sum": self.sum, "buckets": cumulative}
+
+
+class Metrics:
+    """Counters and histograms kept by a SomfyRTS created with metrics=True.
+
+    Counters are updated under the SomfyRTS queue lock or by the single thread dispatching commands, and
+    snapshot() reads them without locking, so a snapshot taken while commands are flowing may be off by the
+    commands in flight."""
+
+    def __init__(self, queue, buckets=DEFAULT_BUCKETS):
+        """Keyword arguments:
+        queue -- the CommandQueue being measured.  Its length and coalescing counters are reported
+        buckets -- upper bounds of the histogram buckets in seconds"""
+        self._queue = queue
+        self.enqueued = 0       # commands passed to up(), down(), stop(), or submit()
+        self.sent = 0           # commands written to the port
+        self.cleared = 0        # pending commands discarded by clear_command_queue() or close()
+        self.cancelled = 0      # pending commands discarded because their futures were cancelled
+        self.queue_depth_max = 0
+        self.time_in_queue = Histogram(buckets)     # from queueing to the start of the write
+        self.dispatch_slack = Histogram(buckets)    # from the end of a pacing sleep to the start of the write
+        self.write_time = Histogram(buckets)        # duration of each write to the port
+        self.sleep_time = Histogram(buckets)        # each sleep between commands
+        self._wake_at = None    # time the current pacing sleep ends
+
+    # Called with the queue protected.
+    def queued(self, count):
+        self.enqueued += count
+        depth = len(self._queue)
+        if depth > self.queue_depth_max:
+            self.queue_depth_max = depth
+
+    # Called by the dispatching thread after writing entry between clock times start and now.
+    def written(self, entry, start, now):
+        self.sent += 1
+        self.write_time.observe(now - start)
+        if entry.queued is not None:
+            self.time_in_queue.observe(start - entry.queued)
+        if self._wake_at is not None:
+            self.dispatch_slack.observe(max(start - self._wake_at, 0.0))
+            self._wake_at = None
+
+    # Called by the dispatching thread when it sleeps at time now until the next command may be sent.
+    def slept(self, now, sleep_time):
+        self.sleep_time.observe(sleep_time)
+        self._wake_at = now + sleep_time
+
+    # Called by the dispatching thread when the queue is empty, which ends any pacing sleep in progress.
+    def idle(self):
+        self._wake_at = None
+
+    def snapshot(self):
+        """Returns the current values as a dict of plain numbers and histogram snapshots"""
+        return {
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "cleared": self.cleared,
+            "cancelled": self.cancelled,
+            "replaced": self._queue.replaced,
+            "dropped": self._queue.dropped,
+            "queue_depth": len(self._queue),
+            "queue_depth_max": self.queue_depth_max,
+            "time_in_queue": self.time_in_queue.snapshot(),
+            "dispatch_slack": self.dispatch_slack.snapshot(),
+            "write_time": self.write_time.snapshot(),
+            "sleep_time": self.sleep_time.snapshot(),
+        }
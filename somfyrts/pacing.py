@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Command pacing.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Enforces the minimum interval between radio commands
+"""
+import os
+import struct
+import threading
+import time
+
+
+class Pacer:
+    """Tracks the earliest time the next command may be sent.
+
+    Times are floats in seconds from whatever clock the owner uses.  A plain Pacer belongs to one controller and
+    does no locking of its own."""
+
+    def __init__(self, interval):
+        """Keyword arguments:
+        interval -- minimum number of seconds between commands"""
+        self.interval = float(interval)
+        self._next_slot = float("-inf")
+
+    def delay(self, now):
+        """Returns the number of seconds until a command may be sent.  Zero or less means send now."""
+        return self._next_slot - now
+
+    def reserve(self, now):
+        """Claims the slot at time now if it is free.  Returns zero or less if the slot was claimed, otherwise the
+        number of seconds until a slot may be free."""
+        delay = self._next_slot - now
+        if delay <= 0.0:
+            self._next_slot = now + self.interval
+        return delay
+
+    def sent(self, now):
+        """Records that a command finished writing at time now"""
+        if now + self.interval > self._next_slot:
+            self._next_slot = now + self.interval
+
+
+class RFDomain(Pacer):
+    """Pacer shared by every controller transmitting into the same radio environment.
+
+    Interference depends on where the radios are, not on which serial port drives them, so controllers that
+    share airspace must keep the interval between each other's commands.  Controllers in different domains
+    transmit independently.  All controllers in a domain must use the same clock."""
+
+    def __init__(self, name, interval=1.5):
+        """Keyword arguments:
+        name -- name of the radio environment, for example a building wing
+        interval -- minimum number of seconds between commands from any controller in the domain"""
+        super().__init__(interval)
+        self.name = name
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "RFDomain({0!r}, {1!r})".format(self.name, self.interval)
+
+    def reserve(self, now):
+        with self._lock:
+            return super().reserve(now)
+
+    def sent(self, now):
+        with self._lock:
+            super().sent(now)
+
+
+class FilePacer(Pacer):
+    """Pacer whose next slot lives in a small memory-mapped file so that every process on the host using the same
+    file shares one pacing clock.  Pass it to SomfyRTS as rf_domain.
+
+    The record is updated under an exclusive fcntl.flock(), so this class is only available on POSIX systems.
+    Times come from time.monotonic(), which is system wide, so all users must use the default MonotonicClock.
+
+    Processes are served in the order they first asked for a slot.  The record holds a ticket counter like a
+    bakery's: a process that finds the slot taken draws the next ticket and is told when its turn should come.
+    Each turn is one slot.  A process that has not claimed its turn within turn_timeout seconds of the slot
+    opening, because it exited or no longer has anything to send, loses it to the next ticket."""
+
+    # next slot, next ticket to draw, ticket being served, time the current turn began
+    _record = struct.Struct("dQQd")
+    stale_margin = 60.0     # seconds beyond one interval after which a recorded time is taken to predate a reboot
+    turn_timeout = 0.25     # seconds the holder of the current ticket has to claim the open slot
+
+    def __init__(self, path, interval=1.5):
+        """Opens or creates the pacing file.
+
+        Keyword arguments:
+        path -- file holding the shared record.  Every cooperating process must use the same path
+        interval -- minimum number of seconds between commands from any process"""
+        import fcntl
+        import mmap
+        super().__init__(interval)
+        self.path = path
+        self._fcntl = fcntl
+        self._lock = threading.Lock()      # flock() does not exclude threads sharing this file descriptor
+        self._ticket = None                # ticket drawn by this object while it waits for a slot
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if os.fstat(self._fd).st_size < self._record.size:
+                os.ftruncate(self._fd, self._record.size)
+            self._map = mmap.mmap(self._fd, self._record.size)
+        except:
+            os.close(self._fd)
+            raise
+
+    def __repr__(self):
+        return "FilePacer({0!r}, {1!r})".format(self.path, self.interval)
+
+    # Called with both locks held.  Returns [next slot, next ticket, ticket served, turn start].  A time far more
+    # than one interval ahead can only be left over from before a reboot reset the monotonic clock, so the record
+    # is reset, dropping any tickets drawn before the reboot.  The margin must be generous: now was read before the
+    # flock() was acquired, so a process that waited for the lock while another sent a command legitimately sees a
+    # slot slightly over one interval away.
+    def _read(self, now):
+        record = list(self._record.unpack_from(self._map, 0))
+        if max(record[0], record[3]) - now > self.interval + self.stale_margin:
+            record = [now, record[1], record[1], now]
+            self._ticket = None
+        return record
+
+    def _write(self, record):
+        self._record.pack_into(self._map, 0, *record)
+
+    def delay(self, now):
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                return self._read(now)[0] - now
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def reserve(self, now):
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                return self._reserve(now)
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    # Called with both locks held.
+    def _reserve(self, now):
+        record = self._read(now)
+        slot, next_ticket, serving, turn_start = record
+        if self._ticket is not None and self._ticket < serving:
+            self._ticket = None         # the turn was missed, or the record was reset
+        if self._ticket is None:
+            self._ticket = next_ticket
+            record[1] = next_ticket + 1
+            if self._ticket == serving:
+                record[3] = turn_start = now
+        # The turn of a ticket holder that has not come back passes to the next ticket.
+        if serving != self._ticket and now > max(slot, turn_start) + self.turn_timeout:
+            serving = record[2] = serving + 1
+            turn_start = record[3] = now
+        delay = slot - now
+        if serving == self._ticket:
+            if delay <= 0.0:
+                self._ticket = None
+                record[0] = now + self.interval
+                record[2] = serving + 1
+                record[3] = now
+        else:
+            # Come back when the turn should arrive if every ticket ahead uses its slot, or, if that time has
+            # passed, when the current turn expires.
+            expected = max(slot, turn_start) + (self._ticket - serving - 1) * self.interval
+            if expected <= now:
+                expected = max(slot, turn_start) + self.turn_timeout
+            delay = max(expected - now, 0.001)
+        self._write(record)
+        return delay
+
+    def sent(self, now):
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                record = self._read(now)
+                if record[0] - now < self.interval:
+                    record[0] = now + self.interval
+                    self._write(record)
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def close(self):
+        """Passes on this process's turn if it is the one being served, then unmaps and closes the pacing file"""
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                now = time.monotonic()
+                record = self._read(now)
+                if self._ticket == record[2]:
+                    record[2] += 1
+                    record[3] = now
+                    self._write(record)
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+            self._map.close()
+            os.close(self._fd)
+
+
+_rf_domains = {}
+_rf_domains_lock = threading.Lock()
+
+
+def get_rf_domain(name, interval=1.5):
+    """Returns the RFDomain with the given name, creating it with interval if it does not exist yet"""
+    with _rf_domains_lock:
+        domain = _rf_domains.get(name)
+        if domain is None:
+            domain = _rf_domains[name] = RFDomain(name, interval)
+        return domain
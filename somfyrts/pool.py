@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Routing of commands across several Universal RTS Interfaces.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Control more shades than one Somfy Universal RTS Interface supports by pooling several interfaces
+"""
+from somfyrts import SomfyRTS
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SomfyRTSPool:
+    """Routes commands for logical shades to the Universal RTS Interface and channel that controls each one.
+
+    Every interface gets its own SomfyRTS, so each paces its own commands and interfaces transmit in
+    parallel.  A scene spread over four interfaces finishes in roughly a quarter of the serialized time."""
+
+    def __init__(self, channel_map, **options):
+        """Opens one SomfyRTS per distinct port.
+
+        Keyword arguments:
+        channel_map -- mapping of logical shade name or ID to a (port, channel) tuple.  port is a url for a
+                       serial port or an open serial port instance, as accepted by SomfyRTS
+        options -- additional keyword arguments such as interval, version, clock, or dispatcher passed to every
+                   SomfyRTS.  Unless a SharedDispatcher is given, each SomfyRTS gets its own thread"""
+        if options.get("dispatcher") is None:
+            options["thread"] = True
+        self._routes = {}
+        self._controllers = {}
+        try:
+            for name, (port, channel) in channel_map.items():
+                key = port if isinstance(port, str) else id(port)
+                rts = self._controllers.get(key)
+                if rts is None:
+                    logger.info("opening controller for port %s", port)
+                    rts = SomfyRTS(port, **options)
+                    self._controllers[key] = rts
+                self._routes[name] = (rts, channel)
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        """Performs no function.  Returns original SomfyRTSPool object (self)."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes every controller."""
+        self.close()
+
+    @property
+    def controllers(self):
+        """List of the SomfyRTS objects in the pool"""
+        return list(self._controllers.values())
+
+    def route(self, name):
+        """Returns the (SomfyRTS, channel) tuple for a logical shade.  Raises KeyError for unknown names."""
+        return self._routes[name]
+
+    def submit(self, commands):
+        """Queues many commands at once.  Commands for the same controller are submitted to it together.
+
+        Returns a list with a concurrent.futures.Future per shade, in order.
+
+        Keyword arguments:
+        commands -- iterable of (command, names) or (command, names, priority) tuples where command is 'U',
+                    'D', or 'S' and names is None, a single shade name, or a collection of shade names"""
+        per_controller = {}
+        order = []
+        for item in commands:
+            command, names = item[0], item[1]
+            priority = item[2] if len(item) > 2 else None
+            if names is None:
+                continue
+            if isinstance(names, (str, int)):
+                names = (names,)
+            for name in names:
+                rts, channel = self._routes[name]
+                pending = per_controller.setdefault(rts, [])
+                order.append((rts, len(pending)))
+                pending.append((command, channel, priority))
+        results = {rts: rts.submit(pending) for rts, pending in per_controller.items()}
+        return [results[rts][index] for rts, index in order]
+
+    def up(self, names, priority=None):
+        """Send an up command to one or more shades.  Returns a list of futures, one per shade.
+
+        Keyword arguments:
+        names - can be None, a single shade name, or a collection of shade names
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self.submit([("U", names, priority)])
+
+    def down(self, names, priority=None):
+        """Send a down command to one or more shades.  Returns a list of futures, one per shade.
+
+        Keyword arguments:
+        names - can be None, a single shade name, or a collection of shade names
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self.submit([("D", names, priority)])
+
+    def stop(self, names, priority=None):
+        """Send a stop command to one or more shades.  Returns a list of futures, one per shade.
+
+        Keyword arguments:
+        names - can be None, a single shade name, or a collection of shade names
+        priority - PRIORITY_HIGH, PRIORITY_NORMAL, or PRIORITY_LOW.  None uses DEFAULT_PRIORITIES"""
+        return self.submit([("S", names, priority)])
+
+    def clear_command_queue(self):
+        """Discard any pending commands on every controller."""
+        for rts in self._controllers.values():
+            rts.clear_command_queue()
+
+    def flush_command_queue(self, timeout=None):
+        """Wait for every controller to send its pending commands.
+
+        returns True if all commands are processed.  False indicates timeout.  The timeout applies to each
+        controller in turn; since they run in parallel this is normally the overall wait."""
+        return all([rts.flush_command_queue(timeout) for rts in self._controllers.values()])
+
+    def close(self):
+        """Closes every controller"""
+        controllers, self._controllers = self._controllers, {}
+        for rts in controllers.values():
+            rts.close()
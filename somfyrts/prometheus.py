@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Prometheus exporter for SomfyRTS metrics.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Serve the metrics of one or more SomfyRTS objects in the Prometheus text format over HTTP
+"""
+import http.server
+import socketserver
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# (snapshot key, metric name, help text)
+COUNTERS = (
+    ("enqueued", "commands_enqueued_total", "Commands passed to up(), down(), stop(), or submit()"),
+    ("sent", "commands_sent_total", "Commands written to the serial port"),
+    ("cleared", "commands_cleared_total", "Pending commands discarded by clear_command_queue() or close()"),
+    ("cancelled", "commands_cancelled_total", "Pending commands discarded because their futures were cancelled"),
+    ("replaced", "commands_replaced_total", "Pending commands superseded by a newer command for the channel"),
+    ("dropped", "commands_dropped_total", "Commands discarded because the same command was already pending"),
+)
+GAUGES = (
+    ("queue_depth", "queue_depth", "Commands waiting to be sent"),
+    ("queue_depth_max", "queue_depth_max", "Largest number of commands waiting to be sent"),
+)
+HISTOGRAMS = (
+    ("time_in_queue", "time_in_queue_seconds", "Time from queueing a command to the start of its write"),
+    ("dispatch_slack", "dispatch_slack_seconds", "Time from the end of a pacing sleep to the start of the write"),
+    ("write_time", "write_seconds", "Duration of each write to the serial port"),
+    ("sleep_time", "sleep_seconds", "Duration of each sleep between commands"),
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_metrics(sources, prefix="somfyrts"):
+    """Returns the metrics in the Prometheus text exposition format.
+
+    Keyword arguments:
+    sources -- mapping of a controller name, used as the controller label, to a Metrics object
+    prefix -- prepended to every metric name"""
+    snapshots = [(_escape(name), metrics.snapshot()) for name, metrics in sorted(sources.items())]
+    lines = []
+    for kind, metrics in (("counter", COUNTERS), ("gauge", GAUGES)):
+        for key, name, description in metrics:
+            lines.append("# HELP {0}_{1} {2}".format(prefix, name, description))
+            lines.append("# TYPE {0}_{1} {2}".format(prefix, name, kind))
+            for controller, snapshot in snapshots:
+                lines.append('{0}_{1}{{controller="{2}"}} {3}'.format(prefix, name, controller, snapshot[key]))
+    for key, name, description in HISTOGRAMS:
+        lines.append("# HELP {0}_{1} {2}".format(prefix, name, description))
+        lines.append("# TYPE {0}_{1} histogram".format(prefix, name))
+        for controller, snapshot in snapshots:
+            histogram = snapshot[key]
+            for bound, count in histogram["buckets"]:
+                lines.append('{0}_{1}_bucket{{controller="{2}",le="{3}"}} {4}'.format(
+                    prefix, name, controller, "+Inf" if bound == float("inf") else repr(bound), count))
+            lines.append('{0}_{1}_sum{{controller="{2}"}} {3!r}'.format(prefix, name, controller, histogram["sum"]))
+            lines.append('{0}_{1}_count{{controller="{2}"}} {3}'.format(prefix, name, controller,
+                                                                       histogram["count"]))
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Answers GET /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = format_metrics(self.server.sources).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class MetricsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """HTTP server answering GET /metrics for Prometheus.  Binds to the loopback interface by default."""
+
+    daemon_threads = True
+
+    def __init__(self, sources, address=("127.0.0.1", 9464)):
+        """Binds the socket.
+
+        Keyword arguments:
+        sources -- mapping of a controller name to a Metrics object, read on every request
+        address -- (host, port) to listen on.  Port 0 picks a free port, see server_address"""
+        self.sources = sources
+        super().__init__(address, _Handler)
+        self._thread = None
+
+    def start(self):
+        """Serves requests on a background thread until close() is called.  Returns self."""
+        self._thread = threading.Thread(target=lambda: self.serve_forever(), name="SomfyRTS metrics")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops the background thread, if any, and closes the socket."""
+        self.close()
+
+    def close(self):
+        """Stops the background thread, if any, and closes the socket"""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Text command protocol shared by the daemon and the command line.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Parses newline delimited text commands such as "U 3", "down 1 2", "D 1-5", or "S all"
+"""
+import os
+import re
+
+VERBS = {
+    'U': 'U', 'UP': 'U',
+    'D': 'D', 'DOWN': 'D',
+    'S': 'S', 'STOP': 'S',
+    'CLEAR': 'CLEAR',
+    'FLUSH': 'FLUSH',
+    'PING': 'PING',
+}
+MOTOR_COMMANDS = ('U', 'D', 'S')
+
+
+class ProtocolError(ValueError):
+    """Raised for a text command that can not be parsed"""
+    pass
+
+
+def default_socket_path(port):
+    """Returns the UNIX domain socket path used by the daemon for a serial port when none is given.
+
+    Lives here rather than in somfyrts.daemon so the command line can look for a running daemon without
+    importing socketserver.  TMPDIR, TEMP, and TMP are honoured in the same order as tempfile.gettempdir()."""
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", port.strip("/"))
+    directory = os.environ.get("TMPDIR") or os.environ.get("TEMP") or os.environ.get("TMP") or "/tmp"
+    return os.path.join(directory, "somfyrts-{0}.sock".format(name))
+
+
+def parse_channels(words, channel_count=None):
+    """Returns a list of channel numbers from a sequence of words.  A word may be a channel number, an inclusive
+    range such as 1-5, or 'all' for channels 1 through channel_count.  A range is checked before it is expanded,
+    so a line such as 'D 1-999999999' is refused rather than building a huge list: its first channel must not be
+    after its last and, when channel_count is given, both must be channels of the controller."""
+    channels = []
+    for word in words:
+        if word.lower() == "all":
+            if channel_count is None:
+                raise ProtocolError("'all' is not supported here")
+            channels.extend(range(1, channel_count + 1))
+            continue
+        first, _, last = word.partition("-")
+        try:
+            if last:
+                first, last = int(first), int(last)
+            else:
+                channels.append(int(word))
+                continue
+        except ValueError:
+            raise ProtocolError("invalid channel '{0}'".format(word))
+        if first > last or channel_count is not None and not (1 <= first and last <= channel_count):
+            raise ProtocolError("invalid channel range '{0}'".format(word))
+        channels.extend(range(first, last + 1))
+    return channels
+
+
+def parse_command(line, channel_count=None):
+    """Parses one line.  Returns (verb, arguments) where verb is 'U', 'D', 'S', 'CLEAR', 'FLUSH', or 'PING'.
+    Arguments is a list of channel numbers for 'U', 'D', and 'S', an optional timeout in seconds for 'FLUSH',
+    and None otherwise.  Returns (None, None) for a blank line or a comment starting with '#'.
+
+    Keyword arguments:
+    line -- text of the command
+    channel_count -- number of channels 'all' expands to, or None if 'all' is not allowed"""
+    words = line.split("#", 1)[0].split()
+    if not words:
+        return None, None
+    verb = VERBS.get(words[0].upper())
+    if verb is None:
+        raise ProtocolError("unknown command '{0}'".format(words[0]))
+    if verb in MOTOR_COMMANDS:
+        return verb, parse_channels(words[1:], channel_count)
+    if verb == 'FLUSH' and len(words) > 1:
+        try:
+            return verb, float(words[1])
+        except ValueError:
+            raise ProtocolError("invalid timeout '{0}'".format(words[1]))
+    return verb, None
+
+
+def execute_command(rts, line):
+    """Parses one line and performs it on a SomfyRTS.  Returns 'OK' or 'ERR timeout' for a FLUSH that timed out.
+    Raises ProtocolError for lines that can not be parsed and AssertionError for invalid channels."""
+    verb, arguments = parse_command(line, rts.channel_count)
+    if verb in MOTOR_COMMANDS:
+        rts.submit([(verb, arguments)])
+    elif verb == 'CLEAR':
+        rts.clear_command_queue()
+    elif verb == 'FLUSH':
+        if not rts.flush_command_queue(arguments):
+            return "ERR timeout"
+    return "OK"
+
+
+def format_command(command, channels):
+    """Returns the line for a motor command and a collection of channel numbers"""
+    return "{0} {1}\n".format(command, " ".join(str(c) for c in channels))
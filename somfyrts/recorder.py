@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Fixed size record of the most recently sent commands.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Keeps timing data of the last commands sent for post-mortem analysis
+"""
+from array import array
+import sys
+
+
+class FlightRecorder:
+    """Ring buffer of the last size commands written to the port.
+
+    Each command is stored as the clock time its write completed, its channel, its command letter, and the
+    seconds it waited in the queue.  The fields live in four preallocated arrays, so recording a command
+    allocates nothing and the recorder never grows.
+
+    Commands are recorded by the single thread dispatching them.  Reading from another thread while commands
+    are sent may return a partly overwritten oldest entry, which is acceptable for post-mortem data."""
+
+    def __init__(self, size=256):
+        """Keyword arguments:
+        size -- number of commands kept"""
+        assert size > 0
+        self.size = size
+        self._times = array('d', [0.0]) * size
+        self._channels = array('H', [0]) * size
+        self._commands = array('B', [0]) * size
+        self._waits = array('d', [0.0]) * size
+        self._count = 0     # commands recorded since creation
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def record(self, now, channel, command, wait):
+        """Records a command written at clock time now after waiting wait seconds in the queue"""
+        index = self._count % self.size
+        self._times[index] = now
+        self._channels[index] = channel
+        self._commands[index] = ord(command)
+        self._waits[index] = wait
+        self._count += 1
+
+    def entries(self):
+        """Returns a list of (time, channel, command, wait) tuples, oldest first"""
+        count = self._count
+        first = max(count - self.size, 0)
+        result = []
+        for position in range(first, count):
+            index = position % self.size
+            result.append((self._times[index], self._channels[index], chr(self._commands[index]),
+                           self._waits[index]))
+        return result
+
+    def format(self):
+        """Returns the recorded commands as text, one per line, oldest first"""
+        lines = ["{0:>14} {1:>7} {2:>7} {3:>10}".format("time", "channel", "command", "wait")]
+        for now, channel, command, wait in self.entries():
+            lines.append("{0:14.6f} {1:7} {2:>7} {3:10.6f}".format(now, channel, command, wait))
+        return "\n".join(lines)
+
+    def dump(self, file=None):
+        """Writes format() to file, standard error by default"""
+        file = sys.stderr if file is None else file
+        file.write(self.format() + "\n")
+        file.flush()
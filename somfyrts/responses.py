@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Parsing of controller responses and acknowledgement of sent commands.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Matches responses read from a Somfy Universal RTS Interface to the commands that were sent
+"""
+from collections import deque
+from concurrent.futures import Future
+import threading
+import weakref
+
+# TODO:  The controller documentation does not describe a response format.  Both versions are assumed to echo
+# TODO:  each frame they accept, framed exactly as it was sent (b'U1\r' for version one, b'0108U' for version
+# TODO:  II).  If a future user finds the controller answers differently, ResponseParser is the one place that
+# TODO:  needs to change.
+
+
+class NotAcknowledged(Exception):
+    """Set on the acknowledgement future of a command that the controller did not echo"""
+    pass
+
+
+class ResponseParser:
+    """Incrementally splits bytes read from the port into (command, channel) tuples.
+
+    Bytes may arrive in any size of piece.  A partial frame is kept until the rest of it arrives and bytes that
+    can not start a frame, such as line noise, are discarded."""
+
+    def __init__(self, codec):
+        """Keyword arguments:
+        codec -- CommandCodec of the controller, which defines the frames that can be recognized"""
+        self._codec = codec
+        self._lengths = sorted({len(frame) for frame in codec.frames})
+        self._prefixes = {frame[:length] for frame in codec.frames for length in range(1, len(frame))}
+        self._buffer = bytearray()
+        self.discarded = 0      # bytes skipped because they could not start a frame
+
+    def feed(self, data):
+        """Adds bytes read from the port.  Returns a list of the (command, channel) tuples completed by data."""
+        self._buffer += data
+        frames = []
+        start = 0
+        while start < len(self._buffer):
+            length, decoded = self._match(start)
+            if length == 0:     # the rest of the buffer is the start of a frame
+                break
+            if decoded is None:
+                self.discarded += 1
+            else:
+                frames.append(decoded)
+            start += length
+        del self._buffer[:start]
+        return frames
+
+    # Returns (length, (command, channel)) for a frame at start, (0, None) if the buffer holds the start of a
+    # frame, or (1, None) if the byte at start has to be skipped.
+    def _match(self, start):
+        remaining = len(self._buffer) - start
+        for length in self._lengths:
+            if length > remaining:
+                break
+            decoded = self._codec.decode(self._buffer[start:start + length])
+            if decoded is not None:
+                return length, decoded
+        if bytes(self._buffer[start:]) in self._prefixes:
+            return 0, None
+        return 1, None
+
+
+class AckTracker:
+    """Keeps the commands written to the port until the controller acknowledges them.
+
+    The controller answers in order, so a response for a later command means the commands written before it
+    were not acknowledged.  The acknowledgement futures of those commands fail with NotAcknowledged."""
+
+    def __init__(self, max_pending=32):
+        """Keyword arguments:
+        max_pending -- number of unacknowledged commands remembered.  The oldest are failed beyond that, so a
+                       controller that never answers does not cause unbounded growth"""
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = deque()                     # (command, channel, start, ack future) in write order
+        self._acks = weakref.WeakKeyDictionary()    # command future -> acknowledgement future
+        self.unmatched = 0      # responses that did not match any unacknowledged command
+
+    def acknowledgement(self, future):
+        """Returns a concurrent.futures.Future whose result is the number of seconds between the start of the
+        write of the command and its acknowledgement.  future is one of the futures returned by up(), down(),
+        stop(), or submit().  The acknowledgement future is cancelled if the command is never sent."""
+        with self._lock:
+            return self._ack_future(future)
+
+    def sent(self, entry, now):
+        """Records that the write of entry starts at time now.  Called before the write so a response can not
+        arrive first."""
+        with self._lock:
+            ack = Future() if entry.future is None else self._ack_future(entry.future)
+            if not ack.set_running_or_notify_cancel():
+                ack = None      # cancelled by the caller, who no longer wants the result
+            self._pending.append((entry.command, entry.channel, now, ack))
+            expired = [self._pending.popleft() for _ in range(len(self._pending) - self._max_pending)]
+        for item in expired:
+            self._fail(item)
+
+    def received(self, command, channel, now):
+        """Acknowledges the oldest unacknowledged command matching a response read at time now"""
+        with self._lock:
+            for index, pending in enumerate(self._pending):
+                if pending[0] == command and pending[1] == channel:
+                    break
+            else:
+                self.unmatched += 1
+                return
+            missed = [self._pending.popleft() for _ in range(index)]
+            _, _, start, ack = self._pending.popleft()
+        # Futures are completed outside the lock because their callbacks may call back into the tracker.
+        for item in missed:
+            self._fail(item)
+        if ack is not None:
+            ack.set_result(now - start)
+
+    def close(self):
+        """Fails the acknowledgement futures of every unacknowledged command with NotAcknowledged"""
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+        for item in pending:
+            self._fail(item)
+
+    # Called with _lock held.
+    def _ack_future(self, future):
+        ack = self._acks.get(future)
+        if ack is None:
+            ack = self._acks[future] = Future()
+            future.add_done_callback(lambda done: done.cancelled() and ack.cancel())
+        return ack
+
+    @staticmethod
+    def _fail(pending):
+        command, channel, _, ack = pending
+        if ack is not None:
+            ack.set_exception(NotAcknowledged("no response to {0} on channel {1}".format(command, channel)))
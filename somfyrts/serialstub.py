@@ -9,11 +9,20 @@
 Serial testing support.
 """
 import threading
+import time
 
 
 class SerialStub:
 
-    def __init__(self):
+    def __init__(self, write_delay=0.0, responder=None, response_delay=0.0):
+        """Keyword arguments:
+        write_delay -- seconds each write() blocks before returning, to emulate a slow port
+        responder -- called with the data of each write.  The bytes it returns, if any, become readable as the
+                     controller's response.  Pass bytes to have the stub echo every frame
+        response_delay -- seconds after the write before the response can be read"""
+        self.write_delay = write_delay
+        self.responder = responder
+        self.response_delay = response_delay
         self.output = []
         self.is_open = True
         self._lock = threading.Lock()
@@ -22,10 +31,20 @@ class SerialStub:
         self._read_canceled = False
 
     def write(self, data):
+        if self.write_delay > 0.0:
+            time.sleep(self.write_delay)
         if self.is_open:
             self.output.append(data)
         else:
             raise Exception("SerialStub closed when write method called")
+        response = self.responder(data) if self.responder is not None else None
+        if response:
+            if self.response_delay > 0.0:
+                timer = threading.Timer(self.response_delay, self.queue_data_for_read, (response,))
+                timer.daemon = True
+                timer.start()
+            else:
+                self.queue_data_for_read(response)
 
     @property
     def in_waiting(self):
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#
+# Somfy Universal RTS Interface controller communication software.
+#
+# Command lifecycle events and a span exporter.
+# Copyright (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Follow each command from the call that queued it to the write to the serial port
+"""
+import json
+import os
+import threading
+import time
+
+# The event names live in somfyrts.events and are re-exported here for listeners.
+from somfyrts.events import ENQUEUED, SUPERSEDED, DISPATCHED, WRITTEN, FAILED, CLEARED, CANCELLED, CLOSED, \
+    FINAL_EVENTS
+
+
+class JsonLinesSpanExporter:
+    """Listener that writes one JSON object per command, shaped like an OpenTelemetry span, to a file.
+
+    A span starts at ENQUEUED and ends with the command's final event.  DISPATCHED is recorded as a span event
+    and the attributes include the seconds spent queued (until DISPATCHED) and writing (until WRITTEN), which is
+    where the latency of a button press goes.  Add it to one or more SomfyRTS objects with add_listener()."""
+
+    def __init__(self, path, clock=None):
+        """Opens path for appending.
+
+        Keyword arguments:
+        path -- file receiving one span per line
+        clock -- the clock of the SomfyRTS objects traced, used to convert their times to wall clock time.
+                 Defaults to MonotonicClock time"""
+        now = time.monotonic() if clock is None else clock.now()
+        self._offset = time.time() - now
+        self._lock = threading.Lock()
+        self._spans = {}            # future of a queued command -> span being built
+        self._file = open(path, "a")
+
+    def __enter__(self):
+        """Performs no function.  Returns original JsonLinesSpanExporter object (self)."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes the file."""
+        self.close()
+
+    def __call__(self, event, entry, now):
+        key = entry.future if entry.future is not None else entry
+        with self._lock:
+            if self._file.closed:
+                return
+            if event == ENQUEUED:
+                self._spans[key] = {
+                    "name": "somfyrts.command",
+                    "trace_id": os.urandom(16).hex(),
+                    "span_id": os.urandom(8).hex(),
+                    "start_time_unix_nano": self._nanoseconds(now),
+                    "attributes": {"somfyrts.command": entry.command, "somfyrts.channel": entry.channel,
+                                   "somfyrts.priority": entry.priority},
+                    "events": [],
+                    "_start": now,
+                }
+                return
+            span = self._spans.get(key)
+            if span is None:        # queued before the exporter was added
+                return
+            if event == DISPATCHED:
+                span["events"].append({"name": event, "time_unix_nano": self._nanoseconds(now)})
+                span["attributes"]["somfyrts.queued_seconds"] = now - span["_start"]
+                span["_dispatched"] = now
+                return
+            if event not in FINAL_EVENTS:
+                return
+            del self._spans[key]
+            if "_dispatched" in span:
+                span["attributes"]["somfyrts.write_seconds"] = now - span.pop("_dispatched")
+            del span["_start"]
+            span["end_time_unix_nano"] = self._nanoseconds(now)
+            code = "OK" if event == WRITTEN else "ERROR" if event == FAILED else "UNSET"
+            span["status"] = {"code": code, "message": event}
+            self._file.write(json.dumps(span) + "\n")
+
+    def flush(self):
+        """Flushes the spans written so far to the file"""
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """Closes the file.  Spans of commands that have not finished are not written."""
+        with self._lock:
+            self._spans.clear()
+            self._file.close()
+
+    def _nanoseconds(self, now):
+        return int((now + self._offset) * 1e9)
@@ -0,0 +1,150 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for AsyncSomfyRTS
+"""
+
+import asyncio
+import gc
+from unittest import TestCase
+
+from somfyrts import PRIORITY_NORMAL
+from somfyrts.aio import AsyncSomfyRTS
+from somfyrts.serialstub import SerialStub
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncSomfyRTS(TestCase):
+
+    def test_up(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=0) as rts:
+                times = await rts.up(1)
+                self.assertEqual(1, len(times))
+                self.assertEqual([b'U1\r'], ser.output)
+        run(scenario())
+
+    def test_version_2(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=0, version=2) as rts:
+                await rts.up(8)
+                await rts.down([12, 3])
+                await rts.stop(None)
+                self.assertEqual([b'0108U', b'0112D', b'0103D'], ser.output)
+        run(scenario())
+
+    def test_write_error(self):
+        class FailingPort(SerialStub):
+            def write(self, data):
+                if data == b'U2\r':
+                    raise IOError("port disconnected")
+                super().write(data)
+
+        async def scenario():
+            ser = FailingPort()
+            async with AsyncSomfyRTS(ser, interval=0) as rts:
+                with self.assertLogs("somfyrts", "ERROR"):
+                    with self.assertRaises(IOError):
+                        await rts.up([1, 2])
+                    await rts.up(3)
+                self.assertEqual([b'U1\r', b'U3\r'], ser.output)
+        run(scenario())
+
+    def test_interval(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=0.05) as rts:
+                loop = asyncio.get_event_loop()
+                start = loop.time()
+                pending = rts.up([1, 2, 3])
+                self.assertEqual([], ser.output)     # nothing is written until the loop runs
+                times = await pending
+                self.assertEqual([b'U1\r', b'U2\r', b'U3\r'], ser.output)
+                self.assertGreaterEqual(times[1] - times[0], 0.05)
+                self.assertGreaterEqual(times[2] - times[1], 0.05)
+                self.assertLess(loop.time() - start, 0.5)
+        run(scenario())
+
+    def test_flush_command_queue(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=0.02) as rts:
+                rts.up(2)
+                rts.down([1, 3])
+                rts.stop(range(4, 6), priority=PRIORITY_NORMAL)
+                self.assertTrue(await rts.flush_command_queue())
+                self.assertEqual([b'U2\r', b'D1\r', b'D3\r', b'S4\r', b'S5\r'], ser.output)
+        run(scenario())
+
+    def test_flush_timeout(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=20.0) as rts:
+                rts.up([1, 2])
+                self.assertFalse(await rts.flush_command_queue(timeout=0.05))
+                self.assertEqual([b'U1\r'], ser.output)
+        run(scenario())
+
+    def test_clear_command_queue(self):
+        async def scenario():
+            ser = SerialStub()
+            async with AsyncSomfyRTS(ser, interval=20.0) as rts:
+                first = rts.up(1)
+                rest = rts.up([2, 3])
+                await first
+                await rts.clear_command_queue()
+                with self.assertRaises(asyncio.CancelledError):
+                    await rest
+                self.assertEqual([b'U1\r'], ser.output)
+        run(scenario())
+
+    def test_result_not_awaited(self):
+        class FailingPort(SerialStub):
+            def write(self, data):
+                if data == b'D5\r':
+                    raise IOError("port disconnected")
+                super().write(data)
+
+        async def scenario():
+            errors = []
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            async with AsyncSomfyRTS(FailingPort(), interval=0.01) as rts:
+                rts.up([1, 2, 3])
+                await rts.clear_command_queue()
+                with self.assertLogs("somfyrts", "ERROR"):
+                    rts.down(5)
+                    await rts.flush_command_queue()
+                rts.stop(4)
+            await asyncio.sleep(0)
+            gc.collect()
+            self.assertEqual([], errors)
+        run(scenario())
+
+    def test_close(self):
+        async def scenario():
+            ser = SerialStub()
+            rts = AsyncSomfyRTS(ser, interval=20.0)
+            pending = rts.up([1, 2, 3])
+            await asyncio.sleep(0.01)
+            await rts.close()
+            self.assertEqual([b'U1\r'], ser.output)
+            self.assertFalse(ser.is_open)
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+            with self.assertRaises(AssertionError):
+                rts.up(1)
+        run(scenario())
@@ -0,0 +1,53 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for CommandCodec
+"""
+
+from unittest import TestCase
+
+from somfyrts import SomfyRTS
+from somfyrts.codec import CommandCodec, get_codec, register_codec
+from somfyrts.serialstub import SerialStub
+
+
+class TestCommandCodec(TestCase):
+
+    def test_version_1(self):
+        codec = get_codec(1)
+        self.assertEqual(b'U1\r', codec.encode('U', 1))
+        self.assertEqual(b'S5\r', codec.encode('S', 5))
+        self.assertTrue(codec.is_valid('D', 5))
+        self.assertFalse(codec.is_valid('D', 6))
+        self.assertFalse(codec.is_valid('D', 0))
+        self.assertFalse(codec.is_valid('X', 1))
+
+    def test_version_2(self):
+        codec = get_codec(2)
+        self.assertEqual(b'0108U', codec.encode('U', 8))
+        self.assertEqual(b'0116S', codec.encode('S', 16))
+        self.assertFalse(codec.is_valid('U', 17))
+
+    def test_decode(self):
+        codec = get_codec(2)
+        self.assertEqual(('U', 8), codec.decode(b'0108U'))
+        self.assertEqual(('S', 16), codec.decode(bytearray(b'0116S')))
+        self.assertIsNone(codec.decode(b'0117S'))
+
+    def test_encode_shares_bytes(self):
+        codec = get_codec(1)
+        self.assertIs(codec.encode('D', 3), codec.encode('D', 3))
+
+    def test_register_codec(self):
+        register_codec(99, CommandCodec(32, "{0}{1:03}\n", commands=('U', 'D', 'S', 'M')))
+        ser = SerialStub()
+        with SomfyRTS(ser, interval=0, version=99) as rts:
+            rts.up(32)
+            with self.assertRaises(AssertionError):
+                rts.down(33)
+        self.assertEqual([b'U032\n'], ser.output)
@@ -0,0 +1,149 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for CommandQueue
+"""
+
+import concurrent.futures
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from somfyrts import SomfyRTS, commandqueue
+from somfyrts.clock import VirtualClock
+from somfyrts.commandqueue import CommandFuture, CommandQueue, CommandQueueFull, QueuedCommand, \
+    PRIORITY_HIGH, PRIORITY_LOW
+from somfyrts.serialstub import SerialStub
+
+
+class TestCommandQueue(TestCase):
+
+    def test_fifo(self):
+        queue = CommandQueue()
+        for channel in range(1, 6):
+            queue.put(QueuedCommand(channel, 'U', b'U%d\r' % channel))
+        self.assertEqual(5, len(queue))
+        self.assertEqual([1, 2, 3, 4, 5], [queue.get().channel for _ in range(5)])
+        self.assertFalse(queue)
+
+    def test_capacity(self):
+        queue = CommandQueue(capacity=2)
+        queue.put(QueuedCommand(1, 'U', b'U1\r'))
+        queue.put(QueuedCommand(2, 'U', b'U2\r'))
+        with self.assertRaises(CommandQueueFull):
+            queue.put(QueuedCommand(3, 'U', b'U3\r'))
+        self.assertEqual(1, queue.get().channel)
+        queue.put(QueuedCommand(3, 'U', b'U3\r'))
+        self.assertEqual(2, len(queue))
+
+    def test_clear(self):
+        queue = CommandQueue()
+        queue.put(QueuedCommand(1, 'D', b'D1\r'))
+        queue.clear()
+        self.assertEqual(0, len(queue))
+
+    def test_rts_queue_capacity(self):
+        ser = SerialStub()
+        with SomfyRTS(ser, interval=20.0, thread=True, queue_capacity=2) as rts:
+            with self.assertRaises(CommandQueueFull):
+                rts.up([1, 2, 3, 4])
+
+    def test_coalesce(self):
+        queue = CommandQueue(coalesce=True)
+        queue.put(QueuedCommand(3, 'U', b'U3\r'))
+        queue.put(QueuedCommand(1, 'U', b'U1\r'))
+        queue.put(QueuedCommand(3, 'D', b'D3\r'))
+        queue.put(QueuedCommand(1, 'U', b'U1\r'))
+        self.assertEqual(2, len(queue))
+        self.assertEqual(1, queue.replaced)
+        self.assertEqual(1, queue.dropped)
+        self.assertEqual(b'D3\r', queue.get().data)   # replacement keeps the original position
+        self.assertEqual(b'U1\r', queue.get().data)
+        queue.put(QueuedCommand(3, 'S', b'S3\r'))     # channel no longer pending so this is queued normally
+        self.assertEqual(1, len(queue))
+        self.assertEqual(1, queue.replaced)
+
+    def test_priority(self):
+        queue = CommandQueue()
+        queue.put(QueuedCommand(1, 'U', b'U1\r'))
+        queue.put(QueuedCommand(2, 'U', b'U2\r', PRIORITY_LOW))
+        queue.put(QueuedCommand(3, 'S', b'S3\r', PRIORITY_HIGH))
+        queue.put(QueuedCommand(4, 'S', b'S4\r', PRIORITY_HIGH))
+        self.assertEqual([3, 4, 1, 2], [queue.get().channel for _ in range(4)])
+        with self.assertRaises(IndexError):
+            queue.get()
+
+    def test_coalesce_across_priorities(self):
+        queue = CommandQueue(coalesce=True)
+        queue.put(QueuedCommand(1, 'U', b'U1\r'))
+        queue.put(QueuedCommand(2, 'U', b'U2\r'))
+        queue.put(QueuedCommand(2, 'S', b'S2\r', PRIORITY_HIGH))
+        self.assertEqual(2, len(queue))
+        self.assertEqual(1, queue.replaced)
+        self.assertEqual(b'S2\r', queue.get().data)
+        self.assertEqual(b'U1\r', queue.get().data)
+        self.assertFalse(queue)
+
+    def test_no_coalesce(self):
+        queue = CommandQueue()
+        queue.put(QueuedCommand(3, 'U', b'U3\r'))
+        queue.put(QueuedCommand(3, 'D', b'D3\r'))
+        self.assertEqual(2, len(queue))
+
+    def test_rts_coalesce(self):
+        ser = SerialStub()
+        rts = SomfyRTS(ser, interval=20.0, thread=True, coalesce=True)
+        rts.up([1, 2, 3])
+        rts.down(3)
+        rts.down(2)
+        rts.down(2)
+        self.assertEqual(2, rts.commands_replaced)
+        self.assertEqual(1, rts.commands_dropped)
+        rts.close()
+
+    def test_coalesce_after_cancel(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, coalesce=True, clock=clock) as rts:
+            rts.up(1)
+            clock.advance(0.0)
+            cancelled, = rts.up(3)
+            cancelled.cancel()
+            future, = rts.up(3)
+            self.assertFalse(future.cancelled())
+            self.assertEqual(0, rts.commands_dropped)
+            clock.advance(1.5)
+            self.assertEqual(1.5, future.result())
+            self.assertEqual([b'U1\r', b'U3\r'], ser.output)
+
+    def test_command_future(self):
+        future = CommandFuture()
+        self.assertIsNone(future._lazy_condition)     # nothing has used it yet
+        self.assertFalse(future.done())
+        waiter = threading.Thread(target=lambda: self.assertEqual(7, future.result(timeout=5)))
+        waiter.start()
+        self.assertTrue(future.set_running_or_notify_cancel())
+        future.set_result(7)
+        waiter.join()
+        done, _ = concurrent.futures.wait([future, CommandFuture()], timeout=0)
+        self.assertEqual({future}, done)
+
+    def test_future_attributes(self):
+        # Fails if Future.__init__() no longer sets exactly the attributes CommandFuture sets in its place, which
+        # turns the lazy condition off.
+        self.assertIsNotNone(commandqueue._INITIAL_STATE)
+        expected = set(vars(CommandFuture())) - {'_lazy_condition'} | {'_condition'}
+        self.assertEqual(expected, set(vars(concurrent.futures.Future())))
+
+    def test_command_future_fallback(self):
+        with patch.object(commandqueue, "_INITIAL_STATE", None):
+            future = CommandFuture()
+        self.assertIsNotNone(future._lazy_condition)
+        self.assertTrue(future.set_running_or_notify_cancel())
+        future.set_result(7)
+        self.assertEqual(7, future.result(timeout=0))
@@ -0,0 +1,177 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for SomfyRTSDaemon and the text command protocol
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase, skipIf
+
+from somfyrts import SomfyRTS
+from somfyrts.protocol import ProtocolError, parse_command
+from somfyrts.serialstub import SerialStub
+
+
+class TestProtocol(TestCase):
+
+    def test_parse_command(self):
+        self.assertEqual(('U', [3]), parse_command("U 3\n"))
+        self.assertEqual(('D', [1, 2]), parse_command("down 1 2"))
+        self.assertEqual(('CLEAR', None), parse_command("clear"))
+        self.assertEqual(('FLUSH', 2.5), parse_command("FLUSH 2.5"))
+        self.assertEqual((None, None), parse_command("  \n"))
+        with self.assertRaises(ProtocolError):
+            parse_command("open 3")
+        with self.assertRaises(ProtocolError):
+            parse_command("U three")
+
+    def test_ranges_and_all(self):
+        self.assertEqual(('D', [1, 2, 3, 4, 5]), parse_command("D 1-5"))
+        self.assertEqual(('U', [1, 3, 4, 8]), parse_command("U 1 3-4 8"))
+        self.assertEqual(('S', [1, 2, 3, 4, 5]), parse_command("S all", 5))
+        self.assertEqual((None, None), parse_command("# morning scene"))
+        self.assertEqual(('U', [2]), parse_command("U 2  # bedroom"))
+        with self.assertRaises(ProtocolError):
+            parse_command("S all")
+        with self.assertRaises(ProtocolError):
+            parse_command("S 1-")
+
+    def test_range_checked_before_expanding(self):
+        self.assertEqual(('U', [4, 5]), parse_command("U 4-5", 5))
+        for line in ("D 1-999999999", "D 0-3", "D 5-3"):
+            with self.assertRaises(ProtocolError):
+                parse_command(line, 5)
+        with self.assertRaises(ProtocolError):
+            parse_command("D 5-3")
+
+
+@skipIf(os.name != "posix", "UNIX domain sockets are POSIX only")
+class TestSomfyRTSDaemon(TestCase):
+
+    def setUp(self):
+        from somfyrts.daemon import SomfyRTSDaemon
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rts.sock")
+        self.ser = SerialStub()
+        self.rts = SomfyRTS(self.ser, interval=0, thread=True)
+        self.server = SomfyRTSDaemon(self.rts, self.path)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.rts.close()
+        shutil.rmtree(self.directory)
+
+    def test_commands(self):
+        from somfyrts.daemon import DaemonClient
+        with DaemonClient(self.path) as client:
+            client.up(2)
+            client.down([1, 3])
+            client.stop(None)
+            self.assertEqual("OK", client.request("FLUSH 5"))
+        self.assertEqual([b'U2\r', b'D1\r', b'D3\r'], self.ser.output)
+
+    def test_errors(self):
+        from somfyrts.daemon import DaemonClient
+        with DaemonClient(self.path) as client:
+            self.assertTrue(client.request("U 9").startswith("ERR"))
+            self.assertTrue(client.request("jump 1").startswith("ERR"))
+            with self.assertRaises(ProtocolError):
+                client.up(6)
+            self.assertEqual("OK", client.request("PING"))
+
+    def test_clients_share_queue(self):
+        from somfyrts.daemon import DaemonClient
+        clients = [DaemonClient(self.path) for _ in range(3)]
+        for channel, client in enumerate(clients, 1):
+            client.up(channel)
+        clients[0].request("FLUSH 5")
+        for client in clients:
+            client.close()
+        self.assertEqual(sorted([b'U1\r', b'U2\r', b'U3\r']), sorted(self.ser.output))
+
+    def test_round_trip(self):
+        from somfyrts.daemon import DaemonClient
+        with DaemonClient(self.path) as client:
+            client.up(1)
+            start = time.perf_counter()
+            for _ in range(100):
+                client.up(1)
+            elapsed = (time.perf_counter() - start) / 100
+        self.assertLess(elapsed, 0.005)
+
+    def test_already_running(self):
+        from somfyrts.daemon import SomfyRTSDaemon, daemon_running
+        self.assertTrue(daemon_running(self.path))
+        with self.assertRaises(OSError):
+            SomfyRTSDaemon(self.rts, self.path)
+
+
+@skipIf(os.name != "posix", "UNIX domain sockets are POSIX only")
+class TestDaemonCommandLine(TestCase):
+
+    def test_cli_uses_daemon(self):
+        from somfyrts.daemon import daemon_running
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "cli.sock")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        daemon = subprocess.Popen([sys.executable, "-m", "somfyrts", "TEST", "-daemon", "-socket", path,
+                                   "-interval", "0"], env=env)
+        try:
+            for _ in range(500):
+                if daemon_running(path):
+                    break
+                time.sleep(0.01)
+            result = subprocess.run([sys.executable, "-m", "somfyrts", "TEST", "-socket", path, "-up", "1",
+                                     "-verbose"], env=env, stderr=subprocess.PIPE, timeout=30)
+            self.assertEqual(0, result.returncode)
+            self.assertIn(b"queued by daemon", result.stderr)
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=30)
+            self.assertFalse(os.path.exists(path))
+            shutil.rmtree(directory)
+
+    def test_cli_does_not_resend_after_daemon_fails(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "dying.sock")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+
+        def answer_once():     # a daemon that accepts one command and then dies
+            connection, _ = listener.accept()
+            with connection, connection.makefile("rwb") as file:
+                file.readline()
+                file.write(b"OK\n")
+        server = threading.Thread(target=answer_once)
+        server.start()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        try:
+            result = subprocess.run([sys.executable, "-m", "somfyrts", "TEST", "-socket", path, "-interval", "0",
+                                     "-up", "1", "-down", "2", "-verbose"], env=env, stderr=subprocess.PIPE,
+                                    timeout=30)
+            self.assertEqual(1, result.returncode)
+            self.assertIn(b"later commands were not sent", result.stderr)
+            self.assertNotIn(b"sending command", result.stderr)
+        finally:
+            server.join()
+            listener.close()
+            shutil.rmtree(directory)
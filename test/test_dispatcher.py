@@ -0,0 +1,133 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for SharedDispatcher
+"""
+
+import threading
+from unittest import TestCase
+
+from somfyrts import SomfyRTS
+from somfyrts.clock import VirtualClock
+from somfyrts.dispatcher import SharedDispatcher
+from somfyrts.pool import SomfyRTSPool
+from somfyrts.serialstub import SerialStub
+
+
+class TestSharedDispatcher(TestCase):
+
+    def test_one_thread_many_controllers(self):
+        clock = VirtualClock()
+        threads_before = threading.active_count()
+        with SharedDispatcher(clock=clock) as dispatcher:
+            ports = [SerialStub() for _ in range(20)]
+            controllers = [SomfyRTS(port, dispatcher=dispatcher) for port in ports]
+            self.assertEqual(threads_before + 1, threading.active_count())
+            for rts in controllers:
+                rts.up([1, 2, 3])
+            clock.advance(1.5)
+            self.assertTrue(all(len(port.output) == 2 for port in ports))
+            clock.advance(1.5)
+            self.assertTrue(all(port.output == [b'U1\r', b'U2\r', b'U3\r'] for port in ports))
+            for rts in controllers:
+                rts.close()
+
+    def test_independent_pacing(self):
+        clock = VirtualClock()
+        with SharedDispatcher(clock=clock) as dispatcher:
+            fast_port, slow_port = SerialStub(), SerialStub()
+            fast = SomfyRTS(fast_port, interval=0.5, dispatcher=dispatcher)
+            slow = SomfyRTS(slow_port, interval=2.0, dispatcher=dispatcher)
+            fast_futures = fast.down(range(1, 6))
+            slow_futures = slow.down(range(1, 6))
+            clock.advance(8.0)
+            self.assertEqual([0.0, 0.5, 1.0, 1.5, 2.0], [f.result() for f in fast_futures])
+            self.assertEqual([0.0, 2.0, 4.0, 6.0, 8.0], [f.result() for f in slow_futures])
+            fast.close()
+            slow.close()
+
+    def test_flush(self):
+        clock = VirtualClock(auto_advance=True)
+        with SharedDispatcher(clock=clock) as dispatcher:
+            port = SerialStub()
+            with SomfyRTS(port, dispatcher=dispatcher) as rts:
+                rts.up([1, 2, 3])
+                self.assertTrue(rts.flush_command_queue(timeout=5))
+                self.assertEqual(3.0, clock.now())
+                self.assertEqual(3, len(port.output))
+
+    def test_clear(self):
+        clock = VirtualClock()
+        with SharedDispatcher(clock=clock) as dispatcher:
+            port = SerialStub()
+            with SomfyRTS(port, dispatcher=dispatcher) as rts:
+                futures = rts.up([1, 2, 3])
+                clock.advance(0.0)
+                rts.clear_command_queue()
+                self.assertTrue(rts.flush_command_queue(timeout=5))
+                clock.advance(5.0)
+                self.assertEqual([b'U1\r'], port.output)
+                self.assertEqual([False, True, True], [future.cancelled() for future in futures])
+
+    def test_write_error(self):
+        class FailingPort(SerialStub):
+            def write(self, data):
+                if data == b'U2\r':
+                    raise IOError("port disconnected")
+                super().write(data)
+
+        with SharedDispatcher() as dispatcher:
+            port = FailingPort()
+            with SomfyRTS(port, interval=0, dispatcher=dispatcher) as rts:
+                with self.assertLogs("somfyrts", "ERROR"):
+                    futures = rts.up([1, 2, 3])
+                    self.assertTrue(rts.flush_command_queue(timeout=5))
+                self.assertIsInstance(futures[1].exception(timeout=5), IOError)
+                futures[2].result(timeout=5)
+                self.assertEqual([b'U1\r', b'U3\r'], port.output)
+
+    def test_failing_listener(self):
+        def fail(event, entry, now):
+            raise ValueError(event)
+
+        with SharedDispatcher() as dispatcher:
+            ports = [SerialStub(), SerialStub()]
+            with SomfyRTS(ports[0], interval=0, dispatcher=dispatcher) as failing, \
+                    SomfyRTS(ports[1], interval=0, dispatcher=dispatcher) as healthy:
+                failing.add_listener(fail)
+                with self.assertLogs("somfyrts", "ERROR"):
+                    failing.up([1, 2])
+                    healthy.down(3)
+                    self.assertTrue(failing.flush_command_queue(timeout=5))
+                    self.assertTrue(healthy.flush_command_queue(timeout=5))
+                failing.up(4)
+                self.assertTrue(failing.flush_command_queue(timeout=5))
+        self.assertEqual([b'U1\r', b'U2\r', b'U4\r'], ports[0].output)
+        self.assertEqual([b'D3\r'], ports[1].output)
+
+    def test_close_controller_with_pending_commands(self):
+        clock = VirtualClock()
+        with SharedDispatcher(clock=clock) as dispatcher:
+            port = SerialStub()
+            rts = SomfyRTS(port, dispatcher=dispatcher)
+            futures = rts.up([1, 2])
+            clock.advance(0.0)
+            rts.close()
+            clock.advance(5.0)
+            self.assertEqual([b'U1\r'], port.output)
+            self.assertTrue(futures[1].cancelled())
+
+    def test_pool(self):
+        clock = VirtualClock()
+        ports = [SerialStub() for _ in range(4)]
+        channel_map = {i: (ports[i % 4], i // 4 + 1) for i in range(20)}
+        with SharedDispatcher(clock=clock) as dispatcher:
+            with SomfyRTSPool(channel_map, dispatcher=dispatcher) as pool:
+                pool.stop(range(20))
+                clock.advance(6.0)
+                self.assertTrue(all(len(port.output) == 5 for port in ports))
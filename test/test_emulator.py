@@ -0,0 +1,88 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+End to end tests of SomfyRTS over a real serial port opened on an emulated controller
+"""
+
+import sys
+from unittest import TestCase, skipUnless
+
+from serial import Serial
+
+from somfyrts import SomfyRTS
+
+if sys.platform.startswith("linux"):
+    from somfyrts.emulator import ControllerEmulator, DEFAULT_TOLERANCE
+
+
+@skipUnless(sys.platform.startswith("linux"), "the emulator uses a Linux pseudo-terminal")
+class TestControllerEmulator(TestCase):
+
+    def test_version_1(self):
+        with ControllerEmulator(version=1, interval=0.1) as emulator:
+            with SomfyRTS(emulator.port, interval=0.1) as rts:
+                rts.up([1, 2])
+                rts.stop(5)
+            self.assertTrue(emulator.wait_for(3, timeout=5))
+        frames = emulator.frames
+        self.assertEqual([('U', 1), ('U', 2), ('S', 5)], [(frame.command, frame.channel) for frame in frames])
+        self.assertEqual([], emulator.too_soon)
+        self.assertTrue(all(frame.line_ok for frame in frames))
+        self.assertIsNone(frames[0].gap)
+        for frame in frames[1:]:
+            self.assertGreaterEqual(frame.gap, emulator.interval - emulator.tolerance)
+
+    def test_version_2(self):
+        with ControllerEmulator(version=2, interval=0.02) as emulator:
+            with SomfyRTS(emulator.port, interval=0.02, version=2) as rts:
+                rts.down(12)
+                rts.up(8)
+            self.assertTrue(emulator.wait_for(2, timeout=5))
+        self.assertEqual([('D', 12), ('U', 8)], [(frame.command, frame.channel) for frame in emulator.frames])
+        self.assertEqual(0, emulator.discarded)
+
+    def test_default_tolerance(self):
+        # Frames 1.36 seconds apart at the default 1.5 second interval are a pacing error, not jitter.
+        with ControllerEmulator() as emulator:
+            self.assertEqual(DEFAULT_TOLERANCE, emulator.tolerance)
+            with self.assertLogs("somfyrts.emulator", "WARNING"):
+                emulator._frame('U', 1, 100.0, True)
+                emulator._frame('U', 2, 101.36, True)
+                emulator._frame('U', 3, 101.36 + 1.5 - DEFAULT_TOLERANCE / 2, True)
+        self.assertEqual([('U', 2)], [(frame.command, frame.channel) for frame in emulator.too_soon])
+
+    def test_too_soon(self):
+        with ControllerEmulator(interval=0.5) as emulator:
+            with SomfyRTS(emulator.port, interval=0.01) as rts:
+                with self.assertLogs("somfyrts.emulator", "WARNING"):
+                    rts.up([1, 2])
+                    self.assertTrue(emulator.wait_for(2, timeout=5))
+        self.assertEqual([('U', 2)], [(frame.command, frame.channel) for frame in emulator.too_soon])
+
+    def test_transmit_time(self):
+        with ControllerEmulator(interval=0.0, baudrate=9600) as emulator:
+            with Serial(emulator.port) as port:
+                port.write(b'U1\rD2\rS3\r')
+            self.assertTrue(emulator.wait_for(3, timeout=5))
+        # Frames written together queue up behind each other on the line: 3 bytes of 10 bits at 9600 baud.
+        for frame in emulator.frames[1:]:
+            self.assertAlmostEqual(30 / 9600, frame.gap, places=6)
+
+    def test_line_settings(self):
+        with ControllerEmulator() as emulator:
+            with Serial(emulator.port, baudrate=4800, stopbits=2) as port:
+                self.assertEqual((4800, 8, 'N', 2), emulator.line_settings())
+                port.write(b'U1\r')
+                self.assertTrue(emulator.wait_for(1, timeout=5))
+        self.assertFalse(emulator.frames[0].line_ok)
+
+    def test_acknowledged(self):
+        with ControllerEmulator(interval=0.0, echo=True) as emulator:
+            with SomfyRTS(emulator.port, interval=0, acks=True) as rts:
+                future, = rts.up(3)
+                self.assertGreaterEqual(rts.acknowledgement(future).result(timeout=5), 0.0)
@@ -0,0 +1,127 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for CommandJournal
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from somfyrts import SomfyRTS, CommandQueueFull, PRIORITY_HIGH, PRIORITY_NORMAL
+from somfyrts.journal import CommandJournal
+from somfyrts.serialstub import SerialStub
+
+
+def live_commands(path):
+    commands = []
+    journal = CommandJournal(path)
+    journal.replay(commands.extend)
+    journal.close()
+    return commands
+
+
+def close_as_if_crashed(rts):
+    """Closes rts and puts its journal back the way a process that died at this point would have left it"""
+    journal = rts._journal
+    journal.flush()
+    with open(journal.path) as file:
+        saved = file.read()
+    rts.close()
+    with open(journal.path, "w") as file:
+        file.write(saved)
+
+
+class TestCommandJournal(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pending_commands_survive_crash(self):
+        rts = SomfyRTS(SerialStub(), interval=3600, thread=True, journal=self.path)
+        rts.up([1, 2])
+        rts.flush_command_queue(timeout=0.1)
+        rts.stop(3)
+        close_as_if_crashed(rts)
+        self.assertEqual([('U', 2, PRIORITY_NORMAL), ('S', 3, PRIORITY_HIGH)], live_commands(self.path))
+
+    def test_replay(self):
+        rts = SomfyRTS(SerialStub(), interval=3600, thread=True, journal=self.path)
+        rts.up([1, 2, 3])
+        rts.flush_command_queue(timeout=0.1)
+        close_as_if_crashed(rts)
+        port = SerialStub()
+        with SomfyRTS(port, interval=0, journal=self.path):
+            self.assertEqual([b'U2\r', b'U3\r'], port.output)
+        self.assertEqual([], live_commands(self.path))
+
+    def test_close_retires_pending_commands(self):
+        with SomfyRTS(SerialStub(), interval=3600, thread=True, journal=self.path) as rts:
+            rts.up([1, 2, 3])
+            rts.flush_command_queue(timeout=0.1)
+        self.assertEqual([], live_commands(self.path))
+
+    def test_unusable_journal_leaves_no_thread(self):
+        threads = threading.active_count()
+        with self.assertRaises(OSError):
+            SomfyRTS(SerialStub(), thread=True, acks=True, journal=os.path.join(self.path, "missing", "journal"))
+        self.assertEqual(threads, threading.active_count())
+
+    def test_failed_replay_closes(self):
+        with open(self.path, "w") as file:
+            file.write("E 0 U 1 1\nE 1 D 2 1\n")
+        threads = threading.active_count()
+        with self.assertRaises(CommandQueueFull):
+            SomfyRTS(SerialStub(), thread=True, queue_capacity=1, journal=self.path)
+        self.assertEqual(threads, threading.active_count())
+        self.assertEqual([('U', 1, PRIORITY_NORMAL), ('D', 2, PRIORITY_NORMAL)], live_commands(self.path))
+
+    def test_clear_discards(self):
+        with SomfyRTS(SerialStub(), interval=3600, thread=True, journal=self.path) as rts:
+            rts.down([1, 2, 3])
+            rts.clear_command_queue()
+        self.assertEqual([], live_commands(self.path))
+
+    def test_coalesced_commands(self):
+        rts = SomfyRTS(SerialStub(), interval=3600, thread=True, coalesce=True, journal=self.path)
+        rts.up(1)
+        rts.flush_command_queue(timeout=0.1)
+        rts.up([2, 3])
+        rts.down(2)
+        rts.down(2)
+        close_as_if_crashed(rts)
+        # The replacement is journaled, and so replayed, after the commands queued before it.
+        self.assertEqual([('U', 3, PRIORITY_NORMAL), ('D', 2, PRIORITY_NORMAL)], live_commands(self.path))
+
+    def test_priority_is_kept(self):
+        rts = SomfyRTS(SerialStub(), interval=3600, thread=True, journal=self.path)
+        rts.up([1, 2])
+        rts.flush_command_queue(timeout=0.1)
+        rts.stop(4)
+        close_as_if_crashed(rts)
+        self.assertEqual([('U', 2, PRIORITY_NORMAL), ('S', 4, PRIORITY_HIGH)], live_commands(self.path))
+
+    def test_compaction(self):
+        journal = CommandJournal(self.path, compact_threshold=10)
+        with SomfyRTS(SerialStub(), interval=0, journal=journal) as rts:
+            for _ in range(20):
+                rts.up([1, 2])
+                journal.flush()
+        with open(self.path) as file:
+            self.assertLessEqual(len(file.readlines()), 10)
+
+    def test_torn_record(self):
+        with open(self.path, "w") as file:
+            file.write("E 0 U 1 1\nE 1 D 2 1\nD 0\nE 2 S")
+        self.assertEqual([('D', 2, PRIORITY_NORMAL)], live_commands(self.path))
@@ -0,0 +1,97 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Tests for the python3 -m somfyrts command line
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import TestCase, skipIf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*args, **kwargs):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, "-m", "somfyrts"] + list(args), env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, timeout=30, **kwargs)
+
+
+class TestCommandLine(TestCase):
+
+    def test_commands(self):
+        result = run_cli("TEST", "-nodaemon", "-interval", "0", "-up", "1", "2", "-stop", "3", "-verbose")
+        self.assertEqual(0, result.returncode)
+        self.assertIn(b"sending command: b'U2\\r'", result.stderr)
+        self.assertIn(b"sending command: b'S3\\r'", result.stderr)
+
+    def test_stream_stdin(self):
+        result = run_cli("TEST", "-nodaemon", "-interval", "0", "-stream", "-verbose",
+                         input=b"U 3\nD 1-2\njump 4\nS all\n")
+        self.assertEqual(0, result.returncode)
+        self.assertIn(b"jump 4: ERR unknown command 'jump'", result.stderr)
+        for frame in (b"U3", b"D1", b"D2", b"S1", b"S5"):
+            self.assertIn(b"sending command: b'" + frame + b"\\r'", result.stderr)
+
+    def test_test_port_does_not_import_pyserial(self):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        script = "import sys\n" \
+                 "from somfyrts.__main__ import main\n" \
+                 "main(['TEST', '-socket', '/nonexistent/somfyrts.sock', '-interval', '0', '-up', '1'])\n" \
+                 "print(sorted(name for name in sys.modules if name.split('.')[0] in ('serial', 'socketserver')))\n"
+        result = subprocess.run([sys.executable, "-c", script], env=env, stdout=subprocess.PIPE, timeout=30)
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(b"[]", result.stdout.strip())
+
+    def test_optional_features_not_imported(self):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        script = "import sys\n" \
+                 "from somfyrts import SomfyRTS\n" \
+                 "from somfyrts.serialstub import SerialStub\n" \
+                 "SomfyRTS(SerialStub(), interval=0).up(1)\n" \
+                 "print(sorted(name for name in sys.modules if name in ('somfyrts.journal', 'somfyrts.metrics', " \
+                 "'somfyrts.recorder', 'somfyrts.responses', 'somfyrts.tracing')))\n"
+        result = subprocess.run([sys.executable, "-c", script], env=env, stdout=subprocess.PIPE, timeout=30)
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(b"[]", result.stdout.strip())
+
+    @skipIf(os.name != "posix", "FIFOs are POSIX only")
+    def test_stream_fifo(self):
+        directory = tempfile.mkdtemp()
+        fifo = os.path.join(directory, "commands")
+        os.mkfifo(fifo)
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        process = subprocess.Popen([sys.executable, "-m", "somfyrts", "TEST", "-nodaemon", "-interval", "0",
+                                    "-stream", fifo, "-verbose"], env=env, stderr=subprocess.PIPE)
+        output = []
+        sent = threading.Event()
+
+        def read_log():
+            for line in process.stderr:
+                output.append(line)
+                if b"D2" in line:
+                    sent.set()
+        reader = threading.Thread(target=read_log)
+        reader.start()
+        try:
+            # Two writers one after the other.  The stream keeps reading after the first closes the FIFO.
+            for command in (b"U 1\n", b"D 2\n"):
+                with open(fifo, "wb") as writer:
+                    writer.write(command)
+            self.assertTrue(sent.wait(timeout=30))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            reader.join()
+            shutil.rmtree(directory)
+        self.assertIn(b"sending command: b'U1\\r'", b"".join(output))
+        self.assertIn(b"sending command: b'D2\\r'", b"".join(output))
@@ -0,0 +1,103 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for Metrics and the Prometheus exporter
+"""
+
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from somfyrts import SomfyRTS
+from somfyrts.clock import VirtualClock
+from somfyrts.metrics import Histogram
+from somfyrts.prometheus import MetricsServer, format_metrics
+from somfyrts.serialstub import SerialStub
+
+
+class TestHistogram(TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 7.0):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(4, snapshot["count"])
+        self.assertEqual(10.0, snapshot["sum"])
+        self.assertEqual([(1.0, 2), (2.0, 3), (float("inf"), 4)], snapshot["buckets"])
+
+
+class TestMetrics(TestCase):
+
+    def test_disabled_by_default(self):
+        with SomfyRTS(SerialStub(), interval=0) as rts:
+            self.assertIsNone(rts.metrics)
+
+    def test_dispatch(self):
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(SerialStub(), interval=1.0, clock=clock, metrics=True) as rts:
+            rts.up([1, 2, 3])
+            snapshot = rts.metrics.snapshot()
+        self.assertEqual(3, snapshot["enqueued"])
+        self.assertEqual(3, snapshot["sent"])
+        self.assertEqual(3, snapshot["queue_depth_max"])
+        self.assertEqual(0, snapshot["queue_depth"])
+        self.assertEqual(3, snapshot["time_in_queue"]["count"])
+        self.assertEqual(3.0, snapshot["time_in_queue"]["sum"])     # waits of 0, 1, and 2 seconds
+        self.assertEqual(2, snapshot["sleep_time"]["count"])
+        self.assertEqual(2.0, snapshot["sleep_time"]["sum"])
+        self.assertEqual(2, snapshot["dispatch_slack"]["count"])
+        self.assertEqual(0.0, snapshot["dispatch_slack"]["sum"])
+        self.assertEqual(3, snapshot["write_time"]["count"])
+
+    def test_cleared_and_cancelled(self):
+        with SomfyRTS(SerialStub(), interval=3600, thread=True, metrics=True) as rts:
+            futures = rts.up([1, 2, 3])
+            futures[0].result(timeout=5)
+            futures[1].cancel()
+            rts.clear_command_queue()
+            rts.down(4)
+            metrics = rts.metrics
+        self.assertEqual(4, metrics.enqueued)
+        self.assertEqual(1, metrics.sent)
+        self.assertEqual(3, metrics.cleared)   # channels 2 and 3 at clear_command_queue(), channel 4 at close()
+
+    def test_coalesced(self):
+        with SomfyRTS(SerialStub(), interval=3600, thread=True, coalesce=True, metrics=True) as rts:
+            rts.up(1)[0].result(timeout=5)
+            rts.up(2)
+            rts.up(2)
+            rts.down(2)
+            snapshot = rts.metrics.snapshot()
+        self.assertEqual(4, snapshot["enqueued"])
+        self.assertEqual(1, snapshot["dropped"])
+        self.assertEqual(1, snapshot["replaced"])
+        self.assertEqual(1, snapshot["queue_depth"])
+
+
+class TestPrometheus(TestCase):
+
+    def test_format(self):
+        with SomfyRTS(SerialStub(), interval=0, metrics=True) as rts:
+            rts.up([1, 2])
+            text = format_metrics({'/dev/"tty"': rts.metrics})
+        self.assertIn("# TYPE somfyrts_commands_sent_total counter\n", text)
+        self.assertIn('somfyrts_commands_sent_total{controller="/dev/\\"tty\\""} 2\n', text)
+        self.assertIn('somfyrts_write_seconds_bucket{controller="/dev/\\"tty\\"",le="+Inf"} 2\n', text)
+        self.assertIn('somfyrts_write_seconds_count{controller="/dev/\\"tty\\""} 2\n', text)
+
+    def test_server(self):
+        with SomfyRTS(SerialStub(), interval=0, metrics=True) as rts:
+            rts.stop(3)
+            with MetricsServer({"test": rts.metrics}, ("127.0.0.1", 0)).start() as server:
+                url = "http://127.0.0.1:{0}".format(server.server_address[1])
+                with urlopen(url + "/metrics", timeout=5) as response:
+                    self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+                    self.assertIn(b'somfyrts_commands_enqueued_total{controller="test"} 1\n', response.read())
+                with self.assertRaises(HTTPError):
+                    urlopen(url + "/", timeout=5)
@@ -0,0 +1,157 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for Pacer and RFDomain
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, skipIf
+
+from somfyrts import SomfyRTS
+from somfyrts.clock import VirtualClock
+from somfyrts.dispatcher import SharedDispatcher
+from somfyrts.pacing import FilePacer, Pacer, RFDomain, get_rf_domain
+from somfyrts.serialstub import SerialStub
+
+
+class TestPacing(TestCase):
+
+    def test_pacer(self):
+        pacer = Pacer(1.5)
+        self.assertLessEqual(pacer.reserve(10.0), 0.0)
+        self.assertEqual(1.0, pacer.reserve(10.5))
+        pacer.sent(10.2)        # a slow write pushes the next slot out
+        self.assertAlmostEqual(1.7, pacer.delay(10.0))
+        self.assertLessEqual(pacer.reserve(11.7), 0.0)
+
+    def test_get_rf_domain(self):
+        domain = get_rf_domain("test_get_rf_domain", 2.0)
+        self.assertIs(domain, get_rf_domain("test_get_rf_domain"))
+        self.assertEqual(2.0, domain.interval)
+
+    def test_shared_domain_threads(self):
+        clock = VirtualClock()
+        domain = RFDomain("lobby")
+        ports = [SerialStub(), SerialStub()]
+        controllers = [SomfyRTS(port, thread=True, clock=clock, rf_domain=domain) for port in ports]
+        futures = controllers[0].up([1, 2]) + controllers[1].up([1, 2])
+        clock.advance(4.5)
+        times = sorted(f.result() for f in futures)
+        self.assertEqual([0.0, 1.5, 3.0, 4.5], times)
+        for rts in controllers:
+            rts.close()
+
+    def test_domains_in_parallel(self):
+        clock = VirtualClock()
+        with SharedDispatcher(clock=clock) as dispatcher:
+            ports = [SerialStub() for _ in range(4)]
+            domains = ("test_domains_in_parallel east", "test_domains_in_parallel west")
+            controllers = [SomfyRTS(port, dispatcher=dispatcher, rf_domain=domains[i % 2])
+                           for i, port in enumerate(ports)]
+            futures = [rts.down([1, 2, 3]) for rts in controllers]
+            # Six commands per domain.  One domain for everything would take 16.5 seconds, a port each 3.0.
+            clock.advance(7.5)
+            for domain in (0, 1):
+                times = sorted(f.result() for i in (domain, domain + 2) for f in futures[i])
+                self.assertEqual([0.0, 1.5, 3.0, 4.5, 6.0, 7.5], times)
+            for rts in controllers:
+                rts.close()
+
+
+# Run in child processes by test_file_pacer_processes.  Prints the monotonic time of each write.
+_CHILD = """
+import sys
+from somfyrts import SomfyRTS
+from somfyrts.pacing import FilePacer
+from somfyrts.serialstub import SerialStub
+pacer = FilePacer(sys.argv[1], interval=0.1)
+with SomfyRTS(SerialStub(), rf_domain=pacer) as rts:
+    for future in rts.up([1, 2, 3]):
+        print(repr(future.result()))
+pacer.close()
+"""
+
+
+@skipIf(os.name != "posix", "FilePacer requires fcntl")
+class TestFilePacer(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_shared_record(self):
+        first, second = FilePacer(self.path, 1.5), FilePacer(self.path, 1.5)
+        self.assertLessEqual(first.reserve(100.0), 0.0)
+        self.assertEqual(1.0, second.reserve(100.5))
+        second.sent(100.2)
+        self.assertAlmostEqual(1.5, first.delay(100.2))
+        self.assertLessEqual(second.reserve(101.7), 0.0)
+        first.close()
+        second.close()
+
+    def test_stale_record_ignored(self):
+        pacer = FilePacer(self.path, 1.5)
+        pacer.reserve(1000000.0)
+        self.assertLessEqual(pacer.reserve(5.0), 0.0)      # as if the host rebooted
+        # A time read before waiting for another process's flock() is a little behind the slot it then wrote.
+        self.assertAlmostEqual(1.5001, pacer.reserve(4.9999))
+        pacer.close()
+
+    def test_turns_in_order(self):
+        first, second = FilePacer(self.path, 1.0), FilePacer(self.path, 1.0)
+        self.assertLessEqual(first.reserve(0.0), 0.0)
+        self.assertAlmostEqual(0.9, second.reserve(0.1))      # second draws the next turn
+        self.assertAlmostEqual(0.8, first.reserve(0.2))       # and first the one after it
+        # The slot has opened but it is second's turn, even though second wakes a little late.
+        self.assertAlmostEqual(FilePacer.turn_timeout, first.reserve(1.0))
+        self.assertLessEqual(second.reserve(1.05), 0.0)
+        self.assertGreater(first.reserve(1.5), 0.0)
+        self.assertLessEqual(first.reserve(2.05), 0.0)
+        first.close()
+        second.close()
+
+    def test_missed_turn(self):
+        first, second = FilePacer(self.path, 1.0), FilePacer(self.path, 1.0)
+        first.reserve(0.0)
+        second.reserve(0.1)                                 # second never comes back for its turn
+        self.assertGreater(first.reserve(1.0), 0.0)
+        self.assertLessEqual(first.reserve(1.0 + FilePacer.turn_timeout + 0.01), 0.0)
+        # second lost its ticket and queues again behind the slot first just took.
+        self.assertAlmostEqual(1.0, second.reserve(1.26), places=6)
+        first.close()
+        second.close()
+
+    def test_close_passes_turn(self):
+        first, second = FilePacer(self.path, 1.0), FilePacer(self.path, 1.0)
+        first.reserve(0.0)
+        second.reserve(0.1)
+        first.reserve(0.2)
+        second.close()
+        self.assertLessEqual(first.reserve(1.0), 0.0)
+        first.close()
+
+    def test_file_pacer_processes(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        children = [subprocess.Popen([sys.executable, "-c", _CHILD, self.path], stdout=subprocess.PIPE, env=env)
+                    for _ in range(2)]
+        times = []
+        for child in children:
+            output, _ = child.communicate(timeout=30)
+            self.assertEqual(0, child.returncode)
+            times.extend(float(line) for line in output.split())
+        times.sort()
+        self.assertEqual(6, len(times))
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreaterEqual(later - earlier, 0.1)
@@ -0,0 +1,67 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for SomfyRTSPool
+"""
+
+from unittest import TestCase
+
+from somfyrts.clock import VirtualClock
+from somfyrts.pool import SomfyRTSPool
+from somfyrts.serialstub import SerialStub
+
+
+class TestSomfyRTSPool(TestCase):
+
+    def setUp(self):
+        self.ports = [SerialStub() for _ in range(3)]
+        self.clock = VirtualClock()
+        # 15 shades, five per controller, named "shade1" through "shade15"
+        self.channel_map = {"shade{0}".format(i + 1): (self.ports[i // 5], i % 5 + 1) for i in range(15)}
+
+    def test_routing(self):
+        with SomfyRTSPool(self.channel_map, clock=self.clock) as pool:
+            self.assertEqual(3, len(pool.controllers))
+            rts, channel = pool.route("shade7")
+            self.assertEqual(2, channel)
+            pool.up("shade7")
+            pool.down(["shade1", "shade15"])
+            pool.stop(None)
+            self.clock.advance(0.0)
+            self.assertEqual([b'D1\r'], self.ports[0].output)
+            self.assertEqual([b'U2\r'], self.ports[1].output)
+            self.assertEqual([b'D5\r'], self.ports[2].output)
+
+    def test_controllers_run_in_parallel(self):
+        with SomfyRTSPool(self.channel_map, clock=self.clock) as pool:
+            futures = pool.down(sorted(self.channel_map))
+            self.assertEqual(15, len(futures))
+            # Serialized through one interface 15 commands take 21 seconds.  Three interfaces take 6.
+            self.clock.advance(6.0)
+            for port in self.ports:
+                self.assertEqual(5, len(port.output))
+            self.assertEqual(6.0, max(f.result() for f in futures))
+
+    def test_submit_order(self):
+        with SomfyRTSPool(self.channel_map, clock=self.clock) as pool:
+            futures = pool.submit([("U", ["shade1", "shade6", "shade2"]), ("S", "shade11")])
+            self.clock.advance(1.5)
+            self.assertEqual([0.0, 0.0, 1.5, 0.0], [f.result() for f in futures])
+
+    def test_unknown_shade(self):
+        with SomfyRTSPool(self.channel_map, clock=self.clock) as pool:
+            with self.assertRaises(KeyError):
+                pool.up("garage")
+
+    def test_close(self):
+        pool = SomfyRTSPool(self.channel_map, clock=self.clock)
+        pool.up(["shade1", "shade2"])
+        self.clock.advance(0.0)
+        pool.close()
+        self.assertEqual([b'U1\r'], self.ports[0].output)
+        self.assertTrue(all(not port.is_open for port in self.ports))
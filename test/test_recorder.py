@@ -0,0 +1,66 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for FlightRecorder
+"""
+
+import io
+import threading
+from unittest import TestCase
+
+from somfyrts import SomfyRTS
+from somfyrts.clock import VirtualClock
+from somfyrts.recorder import FlightRecorder
+from somfyrts.serialstub import SerialStub
+
+
+class FailingPort(SerialStub):
+    def write(self, data):
+        if data == b'S5\r':
+            raise IOError("port disconnected")
+        super().write(data)
+
+
+class TestFlightRecorder(TestCase):
+
+    def test_ring(self):
+        recorder = FlightRecorder(3)
+        self.assertEqual([], recorder.entries())
+        for channel in range(1, 6):
+            recorder.record(float(channel), channel, 'U', 0.5)
+        self.assertEqual(3, len(recorder))
+        self.assertEqual([(3.0, 3, 'U', 0.5), (4.0, 4, 'U', 0.5), (5.0, 5, 'U', 0.5)], recorder.entries())
+
+    def test_dump(self):
+        recorder = FlightRecorder()
+        recorder.record(12.5, 16, 'D', 0.25)
+        output = io.StringIO()
+        recorder.dump(output)
+        self.assertEqual(["time", "channel", "command", "wait"], output.getvalue().splitlines()[0].split())
+        self.assertEqual(["12.500000", "16", "D", "0.250000"], output.getvalue().splitlines()[1].split())
+
+    def test_invalid_size_leaves_no_thread(self):
+        threads = threading.active_count()
+        with self.assertRaises(AssertionError):
+            SomfyRTS(SerialStub(), thread=True, recorder=0)
+        self.assertEqual(threads, threading.active_count())
+
+    def test_somfyrts(self):
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(SerialStub(), interval=1.0, clock=clock, recorder=2) as rts:
+            rts.up([1, 2])
+            rts.stop(3)
+            self.assertEqual([(1.0, 2, 'U', 1.0), (2.0, 3, 'S', 1.0)], rts.recorder.entries())
+
+    def test_dumped_on_write_error(self):
+        with SomfyRTS(FailingPort(), interval=0, recorder=8) as rts:
+            rts.down(4)
+            with self.assertLogs("somfyrts", "ERROR") as logs:
+                self.assertRaises(IOError, rts.stop, 5)
+        self.assertIn("Last commands sent", logs.output[0])
+        self.assertIn("      4       D", logs.output[0])
@@ -0,0 +1,118 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for response parsing and command acknowledgement
+"""
+
+from concurrent.futures import CancelledError, Future
+from unittest import TestCase
+
+from somfyrts import SomfyRTS, NotAcknowledged
+from somfyrts.codec import get_codec
+from somfyrts.commandqueue import QueuedCommand
+from somfyrts.responses import AckTracker, ResponseParser
+from somfyrts.serialstub import SerialStub
+
+
+def entry(command, channel):
+    return QueuedCommand(channel, command, None, future=Future())
+
+
+class TestResponseParser(TestCase):
+
+    def test_version_1(self):
+        parser = ResponseParser(get_codec(1))
+        self.assertEqual([('U', 1), ('S', 5)], parser.feed(b'U1\rS5\r'))
+
+    def test_version_2(self):
+        parser = ResponseParser(get_codec(2))
+        self.assertEqual([('D', 12), ('U', 8)], parser.feed(b'0112D0108U'))
+
+    def test_partial_frames(self):
+        parser = ResponseParser(get_codec(2))
+        self.assertEqual([], parser.feed(b'01'))
+        self.assertEqual([('D', 12)], parser.feed(b'12D01'))
+        self.assertEqual([('S', 3)], parser.feed(b'03S'))
+
+    def test_noise_is_discarded(self):
+        parser = ResponseParser(get_codec(1))
+        self.assertEqual([('U', 1), ('D', 2)], parser.feed(b'\x00xU1\rU9\rD2\r'))
+        self.assertEqual(5, parser.discarded)
+
+
+class TestAckTracker(TestCase):
+
+    def test_acknowledged(self):
+        tracker = AckTracker()
+        sent = entry('U', 1)
+        tracker.sent(sent, 10.0)
+        tracker.received('U', 1, 10.25)
+        self.assertEqual(0.25, tracker.acknowledgement(sent.future).result(0))
+
+    def test_missing_response(self):
+        tracker = AckTracker()
+        first, second = entry('U', 1), entry('D', 2)
+        tracker.sent(first, 1.0)
+        tracker.sent(second, 2.0)
+        tracker.received('D', 2, 2.5)
+        self.assertRaises(NotAcknowledged, tracker.acknowledgement(first.future).result, 0)
+        self.assertEqual(0.5, tracker.acknowledgement(second.future).result(0))
+
+    def test_unmatched_response(self):
+        tracker = AckTracker()
+        sent = entry('U', 1)
+        tracker.sent(sent, 1.0)
+        tracker.received('S', 3, 1.5)
+        self.assertEqual(1, tracker.unmatched)
+        self.assertFalse(tracker.acknowledgement(sent.future).done())
+
+    def test_max_pending(self):
+        tracker = AckTracker(max_pending=2)
+        entries = [entry('U', channel) for channel in (1, 2, 3)]
+        for sent in entries:
+            tracker.sent(sent, 0.0)
+        self.assertRaises(NotAcknowledged, tracker.acknowledgement(entries[0].future).result, 0)
+        self.assertFalse(tracker.acknowledgement(entries[2].future).done())
+
+    def test_cancelled_command(self):
+        tracker = AckTracker()
+        sent = entry('U', 1)
+        ack = tracker.acknowledgement(sent.future)
+        sent.future.cancel()
+        self.assertRaises(CancelledError, ack.result, 0)
+
+    def test_close(self):
+        tracker = AckTracker()
+        sent = entry('U', 1)
+        tracker.sent(sent, 0.0)
+        tracker.close()
+        self.assertRaises(NotAcknowledged, tracker.acknowledgement(sent.future).result, 0)
+
+
+class TestSomfyRTSAcks(TestCase):
+
+    def test_echo(self):
+        port = SerialStub(responder=bytes)
+        with SomfyRTS(port, interval=0, thread=True, acks=True) as rts:
+            futures = rts.up([1, 2]) + rts.stop(3)
+            for future in futures:
+                self.assertGreaterEqual(rts.acknowledgement(future).result(timeout=5), 0.0)
+
+    def test_response_delay(self):
+        port = SerialStub(responder=bytes, response_delay=0.05)
+        with SomfyRTS(port, interval=0, version=2, acks=True) as rts:
+            future, = rts.down(12)
+            self.assertGreaterEqual(rts.acknowledgement(future).result(timeout=5), 0.05)
+
+    def test_no_response(self):
+        port = SerialStub()
+        rts = SomfyRTS(port, interval=0, acks=True)
+        future, = rts.up(1)
+        ack = rts.acknowledgement(future)
+        rts.close()
+        self.assertRaises(NotAcknowledged, ack.result, 5)
@@ -9,22 +9,50 @@
 Unit tests for SomfyRTS
 """
 
-from datetime import datetime
+from concurrent.futures import CancelledError
+import threading
+import time
 from unittest import TestCase
-from time import sleep
 
-from somfyrts import SomfyRTS
+from somfyrts import SomfyRTS, PRIORITY_NORMAL, PRIORITY_HIGH
+from somfyrts.clock import VirtualClock
+from somfyrts.pacing import Pacer
 from somfyrts.serialstub import SerialStub
 
 
-# Simple class used for test assertions.
-class Timer:
+# Clock that jumps forward by exactly the requested timeout and records each wait.
+class StepClock:
     def __init__(self):
-        self._start_time = datetime.now()
+        self.time = 1000.0
+        self.waits = []
 
-    @property
-    def elapsed(self) -> float:
-        return (datetime.now() - self._start_time).total_seconds()
+    def now(self):
+        return self.time
+
+    def wait(self, event, timeout=None):
+        self.waits.append(timeout)
+        self.time += timeout
+        return event.is_set()
+
+
+class FailingPort(SerialStub):
+    def write(self, data):
+        if data == b'U2\r':
+            raise IOError("port disconnected")
+        super().write(data)
+
+
+# Pacer whose shared record cannot be read once, like a FilePacer whose flock() fails.
+class FailingPacer(Pacer):
+    def __init__(self):
+        super().__init__(0)
+        self.failures = 1
+
+    def reserve(self, now):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("no locks available")
+        return super().reserve(now)
 
 
 class TestSomfyRTS(TestCase):
@@ -92,11 +120,11 @@ class TestSomfyRTS(TestCase):
 
     def test_default_interval(self):
         ser = SerialStub()
-        with SomfyRTS(ser) as rts:
-            timer = Timer()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, clock=clock) as rts:
             rts.up(2)
             rts.down([1, 3])
-            self.assertAlmostEqual(timer.elapsed, 3.0, places=1)
+            self.assertEqual(3.0, clock.now())
             self.assertEqual(3, len(ser.output))
             self.assertEqual(b'U2\r', ser.output[0])
             self.assertEqual(b'D1\r', ser.output[1])
@@ -104,12 +132,12 @@ class TestSomfyRTS(TestCase):
 
     def test_interval(self):
         ser = SerialStub()
-        with SomfyRTS(ser, interval=0.25) as rts:
-            timer = Timer()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, interval=0.25, clock=clock) as rts:
             rts.up(2)
             rts.down([1, 3])
             rts.stop(range(4, 6))
-            self.assertAlmostEqual(timer.elapsed, 1.0, places=1)
+            self.assertEqual(1.0, clock.now())
             self.assertEqual(5, len(ser.output))
             self.assertEqual(b'U2\r', ser.output[0])
             self.assertEqual(b'D1\r', ser.output[1])
@@ -119,14 +147,13 @@ class TestSomfyRTS(TestCase):
 
     def test_flush_command_queue(self):
         ser = SerialStub()
-        with SomfyRTS(ser, interval=0.25, thread=True) as rts:
-            timer = Timer()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, interval=0.25, thread=True, clock=clock) as rts:
             rts.up(2)
             rts.down([1, 3])
-            rts.stop(range(4, 6))
-            self.assertAlmostEqual(timer.elapsed, 0.0, places=1)
+            rts.stop(range(4, 6), priority=PRIORITY_NORMAL)
             rts.flush_command_queue()
-            self.assertAlmostEqual(timer.elapsed, 1.0, places=1)
+            self.assertEqual(1.0, clock.now())
             self.assertEqual(5, len(ser.output))
             self.assertEqual(b'U2\r', ser.output[0])
             self.assertEqual(b'D1\r', ser.output[1])
@@ -136,37 +163,272 @@ class TestSomfyRTS(TestCase):
 
     def test_clear_command_queue(self):
         ser = SerialStub()
-        with SomfyRTS(ser, interval=1.0, thread=True) as rts:
-            timer = Timer()
+        clock = VirtualClock()
+        with SomfyRTS(ser, interval=1.0, thread=True, clock=clock) as rts:
             rts.up(2)
             rts.down([1, 3])
-            rts.stop(range(4, 6))
-            self.assertAlmostEqual(timer.elapsed, 0.0, places=1)
-            sleep(1.5)  # Up 2 and Down 1 should make it but no more by now.
+            rts.stop(range(4, 6), priority=PRIORITY_NORMAL)
+            clock.advance(1.5)  # Up 2 and Down 1 should make it but no more by now.
             rts.clear_command_queue()
+            clock.advance(5.0)
             self.assertEqual(2, len(ser.output))
             self.assertEqual(b'U2\r', ser.output[0])
             self.assertEqual(b'D1\r', ser.output[1])
 
     def test_close_threaded(self):
         ser = SerialStub()
-        rts = SomfyRTS(ser, interval=1.0, thread=True)
+        clock = VirtualClock()
+        rts = SomfyRTS(ser, interval=1.0, thread=True, clock=clock)
         rts.up([1, 2, 3])
-        sleep(0.5)
+        clock.advance(0.5)
         self.assertEqual(1, len(ser.output))
         self.assertEqual(b'U1\r', ser.output[0])
         rts.close()
-        sleep(3.0)
+        clock.advance(3.0)
         self.assertEqual(1, len(ser.output))
 
     def test_fast_close(self):
         ser = SerialStub()
-        rts = SomfyRTS(ser, interval=20.0, thread=True)
-        timer = Timer()
+        clock = VirtualClock()
+        rts = SomfyRTS(ser, interval=20.0, thread=True, clock=clock)
         rts.up([1, 2, 3])
-        sleep(0.5)
+        clock.advance(0.5)
         self.assertEqual(1, len(ser.output))
         self.assertEqual(b'U1\r', ser.output[0])
         rts.close()
-        self.assertAlmostEqual(timer.elapsed, 0.5, places=1)
+        self.assertEqual(0.5, clock.now())
         self.assertEqual(1, len(ser.output))
+
+    def test_stop_preempts_queue(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            for _ in range(2):
+                rts.up(range(1, 6))
+                rts.down(range(1, 6))
+            clock.advance(3.0)
+            self.assertEqual(3, len(ser.output))
+            rts.stop(3)
+            # Behind 17 queued commands the stop would wait 25.5 seconds.  Preempting costs one interval.
+            clock.advance(1.5)
+            self.assertEqual(4, len(ser.output))
+            self.assertEqual(b'S3\r', ser.output[-1])
+            rts.clear_command_queue()
+
+    def test_stop_fifo_when_normal_priority(self):
+        ser = SerialStub()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            rts.up(range(1, 6))
+            rts.down(range(1, 6))
+            rts.stop(3, priority=PRIORITY_NORMAL)
+            rts.flush_command_queue()
+            self.assertEqual(15.0, clock.now())
+            self.assertEqual(b'S3\r', ser.output[-1])
+
+    def test_explicit_priority(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            rts.down(range(1, 6))
+            rts.up(4, priority=PRIORITY_HIGH)
+            clock.advance(7.5)
+            self.assertEqual(6, len(ser.output))
+            self.assertLess(ser.output.index(b'U4\r'), 2)
+
+    def test_one_wait_per_command(self):
+        ser = SerialStub()
+        clock = StepClock()
+        with SomfyRTS(ser, clock=clock) as rts:
+            rts.up([1, 2, 3])
+            self.assertEqual([1.5, 1.5], clock.waits)
+            self.assertEqual(1003.0, clock.time)
+            self.assertEqual(3, len(ser.output))
+
+    def test_many_virtual_scenarios(self):
+        # Non-threaded objects on an auto advancing clock need no wall clock time at all.
+        for interval in range(1, 200):
+            ser = SerialStub()
+            clock = VirtualClock(auto_advance=True)
+            with SomfyRTS(ser, interval=interval / 10.0, clock=clock) as rts:
+                rts.up(range(1, 6))
+                self.assertAlmostEqual(4 * interval / 10.0, clock.now())
+                self.assertEqual(5, len(ser.output))
+
+    def test_futures(self):
+        ser = SerialStub()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, clock=clock) as rts:
+            self.assertEqual([], rts.up(None))
+            futures = rts.down([1, 2])
+            self.assertEqual(2, len(futures))
+            self.assertEqual(0.0, futures[0].result())
+            self.assertEqual(1.5, futures[1].result())
+
+    def test_wait_for_one_command(self):
+        ser = SerialStub()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            rts.up(range(1, 6))
+            rts.down(range(1, 6))
+            stop, = rts.stop(3)
+            self.assertLessEqual(stop.result(timeout=5), 1.5)
+            self.assertIn(b'S3\r', ser.output)
+            rts.clear_command_queue()
+
+    def test_cancel_queued_command(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            futures = rts.up([1, 2, 3])
+            clock.advance(0.0)
+            self.assertTrue(futures[1].cancel())
+            self.assertFalse(futures[0].cancel())      # already written
+            clock.advance(1.5)
+            self.assertEqual([b'U1\r', b'U3\r'], ser.output)
+            self.assertEqual(1.5, futures[2].result())
+            with self.assertRaises(CancelledError):
+                futures[1].result()
+
+    def test_clear_cancels_futures(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            futures = rts.up([1, 2])
+            clock.advance(0.0)
+            rts.clear_command_queue()
+            self.assertTrue(futures[0].done() and not futures[0].cancelled())
+            self.assertTrue(futures[1].cancelled())
+
+    def test_submit(self):
+        ser = SerialStub()
+        clock = VirtualClock(auto_advance=True)
+        with SomfyRTS(ser, clock=clock) as rts:
+            futures = rts.submit([("U", 2), ("D", [1, 3]), ("S", range(4, 6), PRIORITY_NORMAL), ("U", None)])
+            self.assertEqual(5, len(futures))
+            self.assertEqual([b'U2\r', b'D1\r', b'D3\r', b'S4\r', b'S5\r'], ser.output)
+            self.assertEqual(6.0, futures[-1].result())
+
+    def test_submit_coalesced(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, coalesce=True, clock=clock) as rts:
+            futures = rts.submit([("U", 3), ("D", 3), ("D", 3), ("U", 4)])
+            self.assertTrue(futures[0].cancelled())
+            self.assertIsNot(futures[0], futures[1])
+            self.assertIs(futures[1], futures[2])
+            clock.advance(3.0)
+            self.assertEqual([b'D3\r', b'U4\r'], ser.output)
+            self.assertEqual(0.0, futures[1].result())
+            self.assertEqual(1.5, futures[3].result())
+
+    def test_submit_validates_first(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            with self.assertRaises(AssertionError):
+                rts.submit([("U", 2), ("D", 9)])
+            clock.advance(0.0)
+            self.assertEqual([], ser.output)
+
+    def test_batch(self):
+        ser = SerialStub()
+        clock = VirtualClock()
+        with SomfyRTS(ser, thread=True, clock=clock) as rts:
+            with rts.batch() as batch:
+                batch.up(2)
+                batch.down([1, 3])
+                clock.advance(0.0)
+                self.assertEqual([], ser.output)
+            self.assertEqual(3, len(batch.futures))
+            clock.advance(3.0)
+            self.assertEqual([b'U2\r', b'D1\r', b'D3\r'], ser.output)
+            self.assertEqual(3.0, batch.futures[2].result())
+
+    def test_batch_discarded_on_exception(self):
+        ser = SerialStub()
+        with SomfyRTS(ser, interval=0) as rts:
+            with self.assertRaises(ValueError):
+                with rts.batch() as batch:
+                    batch.up(1)
+                    raise ValueError()
+            self.assertEqual([], ser.output)
+            self.assertIsNone(batch.futures)
+
+    def test_slow_port_does_not_block_producers(self):
+        ser = SerialStub(write_delay=0.2)
+        with SomfyRTS(ser, interval=0, thread=True) as rts:
+            first, = rts.up(1)
+            while not first.running():
+                time.sleep(0.001)
+            start = time.monotonic()
+            for channel in range(1, 6):
+                rts.down(channel)
+            rts.clear_command_queue()
+            rts.stop(2)
+            latency = time.monotonic() - start
+            # Holding the lock across the write would make these calls wait out the 0.2 second write.
+            self.assertLess(latency, 0.1)
+            rts.flush_command_queue()
+            self.assertEqual([b'U1\r', b'S2\r'], ser.output)
+
+    def test_slow_port_many_producers(self):
+        ser = SerialStub(write_delay=0.02)
+        latencies = []
+
+        def producer(channel):
+            for _ in range(5):
+                start = time.monotonic()
+                rts.up(channel)
+                latencies.append(time.monotonic() - start)
+
+        with SomfyRTS(ser, interval=0, thread=True) as rts:
+            threads = [threading.Thread(target=producer, args=(c,)) for c in range(1, 6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            rts.flush_command_queue()
+        self.assertEqual(25, len(ser.output))
+        self.assertLess(max(latencies), 0.015)
+
+    def test_close_waits_for_write(self):
+        ser = SerialStub(write_delay=0.1)
+        rts = SomfyRTS(ser, interval=0)
+        producer = threading.Thread(target=lambda: rts.up(1))
+        producer.start()
+        time.sleep(0.02)
+        rts.close()
+        producer.join()
+        self.assertEqual([b'U1\r'], ser.output)
+
+    def test_write_error_fails_future(self):
+        ser = FailingPort()
+        with SomfyRTS(ser, interval=0) as rts:
+            rts.up(1)
+            with self.assertRaises(IOError):
+                rts.up(2)
+            future, = rts.up(3)
+            self.assertEqual([b'U1\r', b'U3\r'], ser.output)
+            self.assertTrue(future.done())
+
+    def test_pacer_error_releases_lock(self):
+        ser = SerialStub()
+        with SomfyRTS(ser, rf_domain=FailingPacer()) as rts:
+            with self.assertRaises(OSError):
+                rts.up(1)
+            self.assertFalse(rts._lock.locked())
+            rts.up(2)
+            self.assertEqual([b'U1\r', b'U2\r'], ser.output)
+
+    def test_write_error_threaded(self):
+        ser = FailingPort()
+        with SomfyRTS(ser, interval=0, thread=True) as rts:
+            with self.assertLogs("somfyrts", "ERROR"):
+                futures = rts.up([1, 2, 3])
+                self.assertTrue(rts.flush_command_queue(timeout=5))
+            futures[0].result(timeout=5)
+            self.assertIsInstance(futures[1].exception(timeout=5), IOError)
+            futures[2].result(timeout=5)
+            self.assertEqual([b'U1\r', b'U3\r'], ser.output)
+            rts.down(4)[0].result(timeout=5)
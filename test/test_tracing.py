@@ -0,0 +1,115 @@
+# ! python3
+#
+# This file is part of SomfyRTS - Universal RTS Interface for Somfy motors and controls
+#
+# (C) 2017 Ralph Lipe <ralph@lipe.ws>
+#
+# SPDX-License-Identifier:    MIT
+"""\
+Unit tests for command lifecycle tracing
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from somfyrts import SomfyRTS
+from somfyrts.clock import VirtualClock
+from somfyrts.serialstub import SerialStub
+from somfyrts.tracing import JsonLinesSpanExporter
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, entry, now):
+        self.events.append((event, entry.command, entry.channel))
+
+
+class TestTracing(TestCase):
+
+    def test_written(self):
+        recorder = Recorder()
+        with SomfyRTS(SerialStub(), interval=0) as rts:
+            rts.add_listener(recorder)
+            rts.up([1, 2])
+        self.assertEqual([("enqueued", 'U', 1), ("enqueued", 'U', 2),
+                          ("dispatched", 'U', 1), ("written", 'U', 1),
+                          ("dispatched", 'U', 2), ("written", 'U', 2)], recorder.events)
+
+    def test_superseded(self):
+        recorder = Recorder()
+        with SomfyRTS(SerialStub(), interval=3600, thread=True, coalesce=True) as rts:
+            rts.up(1)[0].result(timeout=5)
+            rts.add_listener(recorder)
+            rts.up(2)
+            rts.up(2)
+            rts.down(2)
+            rts.clear_command_queue()
+        self.assertEqual([("enqueued", 'U', 2), ("enqueued", 'U', 2), ("superseded", 'U', 2),
+                          ("enqueued", 'D', 2), ("superseded", 'U', 2), ("cleared", 'D', 2)], recorder.events)
+
+    def test_cancelled_and_closed(self):
+        recorder = Recorder()
+        rts = SomfyRTS(SerialStub(), interval=3600, thread=True)
+        rts.add_listener(recorder)
+        futures = rts.up([1, 2, 3])
+        futures[0].result(timeout=5)
+        futures[1].cancel()
+        rts.close()
+        self.assertEqual([("closed", 'U', 2), ("closed", 'U', 3)], recorder.events[-2:])
+
+    def test_failing_listener(self):
+        def fail(event, entry, now):
+            raise ValueError(event)
+
+        port = SerialStub()
+        with SomfyRTS(port, interval=0, thread=True) as rts:
+            rts.add_listener(fail)
+            with self.assertLogs("somfyrts", "ERROR"):
+                futures = rts.up([1, 2])
+                self.assertTrue(rts.flush_command_queue(timeout=5))
+            self.assertFalse(rts._lock.locked())
+            self.assertEqual([b'U1\r', b'U2\r'], port.output)
+            self.assertTrue(all(future.done() for future in futures))
+
+    def test_remove_listener(self):
+        recorder = Recorder()
+        with SomfyRTS(SerialStub(), interval=0) as rts:
+            rts.add_listener(recorder)
+            rts.remove_listener(recorder)
+            rts.up(1)
+        self.assertEqual([], recorder.events)
+
+
+class TestJsonLinesSpanExporter(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "spans.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spans(self):
+        clock = VirtualClock(auto_advance=True)
+        with JsonLinesSpanExporter(self.path, clock) as exporter:
+            with SomfyRTS(SerialStub(), interval=2.0, clock=clock, coalesce=True) as rts:
+                rts.add_listener(exporter)
+                rts.submit([('U', 1), ('U', 2), ('D', 1)])
+        with open(self.path) as file:
+            spans = [json.loads(line) for line in file]
+        self.assertEqual(["superseded", "written", "written"], [span["status"]["message"] for span in spans])
+        written = spans[1]
+        self.assertEqual("D", written["attributes"]["somfyrts.command"])
+        self.assertEqual(1, written["attributes"]["somfyrts.channel"])
+        self.assertEqual(0.0, written["attributes"]["somfyrts.queued_seconds"])
+        self.assertEqual(0.0, written["attributes"]["somfyrts.write_seconds"])
+        self.assertEqual(["dispatched"], [event["name"] for event in written["events"]])
+        self.assertEqual(2.0, spans[2]["attributes"]["somfyrts.queued_seconds"])
+        self.assertEqual(32, len(written["trace_id"]))
+        self.assertEqual(16, len(written["span_id"]))
+        self.assertLessEqual(written["start_time_unix_nano"], written["end_time_unix_nano"])